@@ -0,0 +1,50 @@
+"""
+CTMRG and related tensor network methods for 2D classical lattice models.
+
+Submodules and the names below are imported on first access (PEP 562), so
+`import src_codes` costs nothing and a process only pays for numpy/scipy and
+the engines it actually uses. Engines named like their submodule (trg,
+vumps, boundary_mps, tmrg, ipeps, qtmrg) are not re-exported, so that the
+package attribute is always the submodule: call `src_codes.tmrg.tmrg`.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "core": ["Model", "ising", "potts", "clock", "LocalTensors", "local_tensors",
+             "Environment", "Observables", "CTMRGResult", "ctmrg", "run", "ncon",
+             "plan_memory", "finite_ctm", "SparseTensor", "SpectrumLog",
+             "entanglement_entropy", "spectral_gaps", "central_charge"],
+    "constrained": ["hard_squares", "dimers", "six_vertex"],
+    "montecarlo": ["monte_carlo", "binned_error"],
+    "embedding": ["Patch"],
+    "ipeps": ["simple_update", "hardcore_bosons", "checkerboard_ctmrg"],
+    "qtmrg": ["transfer_free_energy", "chain_hamiltonian", "exact_chain"],
+    "trg": ["hotrg"],
+    "vumps": [],
+    "boundary_mps": ["finite_boundary"],
+    "criticality": ["find_tc"],
+    "row_transfer": ["strip_spectrum"],
+    "tmrg": ["stream_chain"],
+    "cache": ["EnvironmentCache"],
+    "store": ["ResultStore"],
+    "parallel": ["ObservablePool", "WorkerPool"],
+}
+_SOURCE = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_SOURCE)
+
+
+def __getattr__(name):
+    if name in _SOURCE:
+        value = getattr(importlib.import_module(f".{_SOURCE[name]}", __name__), name)
+    elif name in _EXPORTS or name in ("startup",):
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_EXPORTS))
@@ -0,0 +1,9 @@
+"""
+Imported once by the forkserver of `parallel.WorkerPool`: loads numpy, scipy
+and the package modules, and seeds the tables of `startup` from the on-disk
+cache, so that forked workers start with all of it in place.
+"""
+
+from . import core, parallel, startup  # noqa: F401
+
+startup.load()
@@ -0,0 +1,216 @@
+"""
+Cache of converged CTMRG environments with nearest-parameter warm starts.
+
+Entries are keyed by the model family (name, q), the bond dimension chi and the
+parameter point (beta, J, h). The most recently used environments stay in
+memory up to a byte budget; the least recently used ones are spilled to one
+.npz file each in the cache directory, next to an index.json that lists every
+entry, so the cache survives the process.
+
+A query that misses returns the environment of the nearest cached point as a
+warm start. As in `criticality`, `run` only warm-starts from environments that
+broke the symmetry (|m| > m_tol) unless the point itself is cached: a
+symmetric environment stays symmetric below T_c. The spatial index is one array of points per (name, q, chi),
+scanned with a scaled Euclidean distance; caches hold at most a few thousand
+points, for which a scan beats maintaining a tree. A converged environment at
+a neighbouring point is within a few iterations of the new fixed point, so
+`EnvironmentCache.run` costs little more than the observables on a hit or
+near miss.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from .core import Environment, ctmrg, local_tensors
+
+ENV_CACHE = os.environ.get(
+    "CTMRG_ENV_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "ctmrg", "environments"))
+
+
+def point(model, beta):
+    """Parameter point (beta, J, h) of `model` at inverse temperature beta."""
+    return (float(beta), float(model.J), float(model.h))
+
+
+def _key(model, chi, p):
+    return (model.name, int(model.q), int(chi), tuple(p))
+
+
+def _filename(key):
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16] + ".npz"
+
+
+class EnvironmentCache:
+    """
+    LRU cache of environments under `max_bytes` of memory, spilling to the
+    directory `path` (memory only if None). `scales` divides the components of
+    the parameter point before distances are taken.
+    """
+
+    def __init__(self, path=ENV_CACHE, max_bytes=256 * 2 ** 20, scales=(1.0, 1.0, 1.0)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.scales = np.asarray(scales, dtype=float)
+        self.memory = OrderedDict()     # key -> Environment, most recent last
+        self.nbytes = 0
+        self.disk = {}                  # key -> file name
+        self.m = {}                     # key -> |m| of the converged environment
+        self.index = {}                 # (name, q, chi) -> [keys]
+        self.hits = self.near = self.misses = 0
+        for key, name, m in self._load_index():
+            self.disk[key], self.m[key] = name, m
+            self._index(key)
+
+    # ------------------------------------------------------------
+    # persistence
+
+    def _load_index(self):
+        if self.path is None:
+            return []
+        try:
+            with open(os.path.join(self.path, "index.json")) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [((e["name"], e["q"], e["chi"], tuple(e["point"])), e["file"], e["m"])
+                for e in entries]
+
+    def _save_index(self):
+        entries = [{"name": k[0], "q": k[1], "chi": k[2], "point": list(k[3]), "file": f,
+                    "m": self.m[k]} for k, f in self.disk.items()]
+        tmp = os.path.join(self.path, f"index.json.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(entries, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, "index.json"))
+
+    def _spill(self, key, env):
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        name = self.disk.get(key) or _filename(key)
+        np.savez(os.path.join(self.path, name), block=env.block,
+                 c_shapes=np.array([c.shape for c in env.C]),
+                 t_shapes=np.array([t.shape for t in env.T]))
+        self.disk[key] = name
+        self._save_index()
+
+    def _read(self, key):
+        with np.load(os.path.join(self.path, self.disk[key])) as data:
+            return Environment.empty([tuple(s) for s in data["c_shapes"]],
+                                     [tuple(s) for s in data["t_shapes"]],
+                                     data["block"].dtype, data["block"].copy())
+
+    def flush(self):
+        """Write every in-memory entry that is not on disk yet."""
+        for key, env in self.memory.items():
+            if key not in self.disk:
+                self._spill(key, env)
+
+    # ------------------------------------------------------------
+    # memory
+
+    def _index(self, key):
+        keys = self.index.setdefault(key[:3], [])
+        if key not in keys:
+            keys.append(key)
+
+    def _forget(self, key):
+        keys = self.index.get(key[:3], [])
+        if key in keys:
+            keys.remove(key)
+        if not keys:
+            self.index.pop(key[:3], None)
+        self.m.pop(key, None)
+
+    def _remember(self, key, env):
+        if key in self.memory:
+            self.nbytes -= self.memory.pop(key).nbytes
+        self.memory[key] = env
+        self.nbytes += env.nbytes
+        while self.nbytes > self.max_bytes and self.memory:
+            old, old_env = self.memory.popitem(last=False)
+            self.nbytes -= old_env.nbytes
+            if old not in self.disk:
+                self._spill(old, old_env)
+            if old not in self.disk:
+                self._forget(old)       # memory-only cache: the entry is gone
+
+    def _fetch(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        if key in self.disk:
+            env = self._read(key)
+            self._remember(key, env)
+            return env
+        return None
+
+    # ------------------------------------------------------------
+    # queries
+
+    def put(self, model, beta, chi, env, m=0.0):
+        """Store a copy of `env`, with magnetization m, as the environment of (model, beta, chi)."""
+        key = _key(model, chi, point(model, beta))
+        stale = self.disk.pop(key, None)
+        if stale is not None and self.path is not None:
+            # drop it from index.json now, so that no process warm-starts from
+            # the old file before this entry is spilled again
+            self._save_index()
+            try:
+                os.remove(os.path.join(self.path, stale))
+            except OSError:
+                pass
+        self.m[key] = abs(float(m))
+        self._index(key)
+        self._remember(key, env.copy())
+
+    def nearest(self, model, beta, chi, m_min=0.0):
+        """
+            nearest(model, beta, chi, m_min=0.0) -> (Environment or None, distance)
+
+        Environment of the closest cached point with |m| >= m_min at the same
+        chi, or, if there is none, at the largest cached chi below it; distance
+        0 is an exact hit.
+        """
+        family = (model.name, int(model.q))
+        groups = {k[2]: [key for key in keys if self.m[key] >= m_min]
+                  for k, keys in self.index.items() if k[:2] == family}
+        chis = sorted((c for c, keys in groups.items() if keys),
+                      key=lambda c: (c != chi, c > chi, -c))
+        if not chis:
+            return None, np.inf
+        keys = groups[chis[0]]
+        points = np.array([k[3] for k in keys]) / self.scales
+        dist = np.linalg.norm(points - np.array(point(model, beta)) / self.scales, axis=1)
+        i = int(np.argmin(dist))
+        d = float(dist[i]) if chis[0] == chi else np.inf
+        return self._fetch(keys[i]), d
+
+    def run(self, model, beta, chi, m_tol=0.1, **kwargs):
+        """
+            run(model, beta, chi, m_tol=0.1, **kwargs) -> CTMRGResult
+
+        `ctmrg` at (model, beta, chi) started from the cached environment of
+        that point, or else from the nearest cached one with |m| > m_tol; the
+        converged environment is cached.
+        """
+        env, d = self.nearest(model, beta, chi)
+        if env is not None and d == 0.0:
+            self.hits += 1
+        else:
+            env, _ = self.nearest(model, beta, chi, m_min=m_tol)
+            if env is None:
+                self.misses += 1
+            else:
+                self.near += 1
+        res = ctmrg(local_tensors(model, beta), chi, env=env, **kwargs)
+        self.put(model, beta, chi, res.env, res.observables.m)
+        return res
+
+    def __len__(self):
+        return len(self.memory.keys() | self.disk.keys())
@@ -0,0 +1,100 @@
+"""
+Local tensors of constrained models: hard squares, dimers and the six-vertex model.
+
+Hard constraints make most entries of the local tensor vanish, which
+`ctmrg(..., absorb="sparse")` exploits through `core.SparseTensor`:
+
+    hard squares   site occupations n = 0, 1 with activity z and no two
+                   neighbours occupied. With the "copy" split Q_out = 1,
+                   Q_in = W of the bond matrix W = [[1, 1], [1, 0]], a has 5
+                   nonzeros out of 16.
+    dimers         close-packed dimers on the bonds, activities z_x and z_y;
+                   exactly one of the four legs of a site is occupied
+                   (4 nonzeros out of 16).
+    six-vertex     arrows on the bonds obeying the ice rule (two in, two out),
+                   vertex weights a, b, c (6 nonzeros out of 16).
+
+The weights are not Boltzmann factors of a temperature, so every tensor has
+beta = 1 and CTMRG reports f = -ln(Z) / N, the negative entropy (dimers,
+ice) or grand potential per site. "E" is the mean of -ln(weight) per site,
+and "m" the order parameter given with each constructor. Reference values:
+hard squares at z = 1 have ln(Z) / N = 0.40749510..., close-packed dimers
+G / pi = 0.29156090... (G Catalan's constant), and ice (a = b = c = 1)
+(3 / 2) ln(4 / 3) = 0.43152310....
+"""
+
+import numpy as np
+
+from .core import LocalTensors, _site_tensor
+
+
+def hard_squares(z=1.0):
+    """
+        hard_squares(z=1.0) -> LocalTensors
+
+    Hard-core lattice gas with activity z; "m" is the density of occupied
+    sites and "E" = -ln(z) times the density.
+    """
+    w = np.array([1.0, z])
+    n = np.array([0.0, 1.0])
+    W = np.array([[1.0, 1.0], [1.0, 0.0]])
+    Q_out, Q_in = np.eye(2), W
+    factors = [Q_out, Q_out, Q_in, Q_in]
+    return LocalTensors(a=_site_tensor(w, factors), beta=1.0, w=w, Q_out=Q_out, Q_in=Q_in,
+                        impurities={"m": _site_tensor(w * n, factors),
+                                    "E": _site_tensor(-np.log(z) * w * n, factors)})
+
+
+def _bond_tensor(weight):
+    # a[r, d, l, u] = weight(r, d, l, u) on the binary leg configurations
+    a = np.zeros((2, 2, 2, 2))
+    for idx in np.ndindex(a.shape):
+        a[idx] = weight(*idx)
+    return a
+
+
+def _log_weight(a):
+    return np.where(a > 0, -np.log(np.where(a > 0, a, 1.0)), 0.0)
+
+
+def dimers(zx=1.0, zy=1.0):
+    """
+        dimers(zx=1.0, zy=1.0) -> LocalTensors
+
+    Close-packed dimers with activity zx per horizontal and zy per vertical
+    dimer; each end of a dimer carries the square root of its activity. "m"
+    is the probability that a site's dimer is horizontal minus vertical.
+    """
+    def weight(r, d, l, u):
+        if r + d + l + u != 1:
+            return 0.0
+        return np.sqrt(zx) if r + l else np.sqrt(zy)
+
+    a = _bond_tensor(weight)
+    sign = _bond_tensor(lambda r, d, l, u: float(r + l - d - u))
+    return LocalTensors(a=a, beta=1.0, w=None, Q_out=None, Q_in=None,
+                        impurities={"m": a * sign, "E": a * _log_weight(a)})
+
+
+def six_vertex(a=1.0, b=1.0, c=1.0):
+    """
+        six_vertex(a=1.0, b=1.0, c=1.0) -> LocalTensors
+
+    Six-vertex model. A bond variable 0 is an arrow pointing right (horizontal
+    bonds) or up (vertical bonds). Vertices where both lines pass straight
+    through have weight a if the two arrows agree (right/up or left/down) and
+    b otherwise; the two vertices where both lines turn have weight c. "m" is
+    the horizontal polarization.
+    """
+    def weight(r, d, l, u):
+        incoming = (l == 0) + (r == 1) + (d == 0) + (u == 1)
+        if incoming != 2:
+            return 0.0
+        if l != r:
+            return c
+        return a if l == d else b
+
+    t = _bond_tensor(weight)
+    polar = _bond_tensor(lambda r, d, l, u: 1.0 - r - l)
+    return LocalTensors(a=t, beta=1.0, w=None, Q_out=None, Q_in=None,
+                        impurities={"m": t * polar, "E": t * _log_weight(t)})
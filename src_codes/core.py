@@ -0,0 +1,1913 @@
+"""
+Corner transfer matrix renormalization group (CTMRG) for 2D classical lattice models.
+
+Layout of the environment, with the labels of Tutorial sections 4-5:
+
+                 T4
+          C4 --------- C1
+          |            |
+       T3 |     a      | T1
+          |            |
+          C3 --------- C2
+                 T2
+
+`Environment.C = [C1, C2, C3, C4]` and `Environment.T = [T1, T2, T3, T4]`.
+Walking clockwise around the ring  T4 -> C1 -> T1 -> C2 -> T2 -> C3 -> T3 -> C4,
+every tensor lists its legs in that same order:
+
+    C_i[prev, next]            (chi, chi)
+    T_i[prev, phys, next]      (chi, d, chi),  phys connects to a
+
+The local tensor is a[r, d, l, u], legs clockwise starting from the right, so
+leg k of `a` connects to T_{k+1}, and C_{i+1} sits between T_i and T_{i+1}.
+Rotating the picture by 90 degrees is then a cyclic shift of the lists and of
+the legs of `a`, which lets one routine handle all four directions.
+
+The iteration (Tutorial section 7) builds the four enlarged corners Q_i, finds
+projectors for the four cuts between them and renormalizes
+
+    C_i  <-  P~ Q_i P            T_i  <-  P~ (T_i a) P
+
+until the corner spectrum stops changing.
+"""
+
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import scipy.linalg
+from scipy.sparse.linalg import LinearOperator, eigs, svds
+
+
+# ============================================================
+# Models
+# ============================================================
+
+@dataclass(frozen=True)
+class Model:
+    """
+    A q-state spin model with nearest-neighbour bond energy e(s, s') and site
+    energy e(s); `name` selects the energy functions ("ising", "potts", "clock").
+    Build instances with `ising`, `potts` and `clock`.
+    """
+    name: str
+    q: int
+    J: float = 1.0
+    h: float = 0.0
+
+    def bond_energy(self):
+        """(q, q) array e(s, s') of one nearest-neighbour bond."""
+        if self.name == "ising":
+            s = np.array([1.0, -1.0])
+            return -self.J * np.outer(s, s)
+        if self.name == "potts":
+            return -self.J * np.eye(self.q)
+        if self.name == "clock":
+            theta = 2 * np.pi * np.arange(self.q) / self.q
+            return -self.J * np.cos(theta[:, None] - theta[None, :])
+        raise ValueError(f"unknown model {self.name!r}")
+
+    def site_energy(self):
+        """(q,) array e(s) of the field term, -h times the order parameter."""
+        return -self.h * self.order_parameter()
+
+    def order_parameter(self):
+        """(q,) array: s for Ising, (q delta_{s,0} - 1)/(q - 1) for Potts, cos(theta_s) for clock."""
+        if self.name == "ising":
+            return np.array([1.0, -1.0])
+        if self.name == "potts":
+            return (self.q * np.eye(self.q)[0] - 1.0) / (self.q - 1.0)
+        if self.name == "clock":
+            return np.cos(2 * np.pi * np.arange(self.q) / self.q)
+        raise ValueError(f"unknown model {self.name!r}")
+
+
+def ising(J=1.0, h=0.0):
+    """Ising model H = -J sum s_i s_j - h sum s_i."""
+    return Model("ising", 2, J, h)
+
+
+def potts(q, J=1.0, h=0.0):
+    """q-state Potts model H = -J sum delta(s_i, s_j) - h sum m(s_i)."""
+    return Model("potts", q, J, h)
+
+
+def clock(q, J=1.0, h=0.0):
+    """q-state clock model H = -J sum cos(theta_i - theta_j) - h sum cos(theta_i)."""
+    return Model("clock", q, J, h)
+
+
+# ============================================================
+# Local tensors
+# ============================================================
+
+@dataclass
+class LocalTensors:
+    """
+    The local tensor a[r, d, l, u] of a model at inverse temperature beta,
+    together with the pieces it is built from:
+
+        a = sum_s w[s] Q_out[s, r] Q_out[s, d] Q_in[s, l] Q_in[s, u]
+
+    where W = Q_out Q_in^T is the bond Boltzmann matrix (Tutorial section 7.2
+    splits it symmetrically; for antiferromagnets the two factors differ).
+    `impurities` maps an observable name to the tensor replacing `a` to
+    measure it: "m" is the order parameter and "E" the energy per site.
+    Vertex models, whose variables live on the bonds, have no such
+    factorization and leave w, Q_out and Q_in as None.
+    """
+    a: np.ndarray
+    beta: float
+    w: np.ndarray
+    Q_out: np.ndarray
+    Q_in: np.ndarray
+    impurities: dict = field(default_factory=dict)
+    model: Model = None
+
+    @property
+    def d(self):
+        return self.a.shape[0]
+
+    @property
+    def factors(self):
+        """(w, [F_r, F_d, F_l, F_u]) with a = sum_s w[s] F_r[s, r] F_d[s, d] F_l[s, l] F_u[s, u]."""
+        if self.w is None:
+            raise ValueError("this local tensor has no site factorization")
+        return self.w, [self.Q_out, self.Q_out, self.Q_in, self.Q_in]
+
+    def boundary(self, kind="open"):
+        """
+        Four vectors closing the legs r, d, l, u of `a` at the edge of a finite
+        lattice. "open" removes the bond factor (free boundary); "fixed" attaches
+        a boundary spin frozen in state 0. For bond variables (w is None) "open"
+        sums over the boundary bond and "fixed" sets it to 0.
+        """
+        if self.w is None and kind in ("open", "fixed"):
+            cap = np.ones(self.d) if kind == "open" else np.eye(self.d)[0]
+            return [cap] * 4
+        if kind == "open":
+            ones = np.ones(len(self.w))
+            v_out = np.linalg.lstsq(self.Q_out, ones, rcond=None)[0]
+            v_in = np.linalg.lstsq(self.Q_in, ones, rcond=None)[0]
+        elif kind == "fixed":
+            v_out, v_in = self.Q_in[0], self.Q_out[0]
+        else:
+            raise ValueError(f"unknown boundary {kind!r}")
+        return [v_out, v_out, v_in, v_in]
+
+
+def _site_tensor(w, factors):
+    # sum_s w[s] F0[s, r] F1[s, d] F2[s, l] F3[s, u]
+    return np.einsum('s,sa,sb,sc,sd->abcd', w, *factors, optimize=True)
+
+
+def local_tensors(model, beta):
+    """
+        local_tensors(model, beta) -> LocalTensors
+
+    Split every bond matrix W = exp(-beta e(s, s')) = U diag(lam) U^T into
+    Q_out = U sqrt|lam| and Q_in = U sqrt|lam| sign(lam), and put one factor on
+    each end of the bond. The energy impurity replaces the right and the down
+    factor in turn by Q'_out with Q'_out Q_in^T = e(s, s') W, and adds the site
+    energy, so that <E> is the energy per site.
+    """
+    e_bond = model.bond_energy()
+    e_site = model.site_energy()
+    W = np.exp(-beta * e_bond)
+    w = np.exp(-beta * e_site)
+    lam, U = np.linalg.eigh(W)
+    root = np.sqrt(np.abs(lam))
+    sign = np.where(lam < 0, -1.0, 1.0)
+    Q_out = U * root
+    Q_in = U * (root * sign)
+    inv_root = np.divide(sign, root, out=np.zeros_like(root), where=root > 1e-300)
+    dQ_out = (e_bond * W) @ (U * inv_root)
+
+    a = _site_tensor(w, [Q_out, Q_out, Q_in, Q_in])
+    m = _site_tensor(w * model.order_parameter(), [Q_out, Q_out, Q_in, Q_in])
+    E = (_site_tensor(w, [dQ_out, Q_out, Q_in, Q_in])
+         + _site_tensor(w, [Q_out, dQ_out, Q_in, Q_in])
+         + _site_tensor(w * e_site, [Q_out, Q_out, Q_in, Q_in]))
+    return LocalTensors(a=a, beta=beta, w=w, Q_out=Q_out, Q_in=Q_in,
+                        impurities={"m": m, "E": E}, model=model)
+
+
+def rotate(a, k):
+    """Relabel the legs of a[r, d, l, u] so that leg 0 of the result is leg k of `a`."""
+    return np.transpose(a, [(k + j) % 4 for j in range(4)])
+
+
+def rotate_factors(factors, k):
+    """The factors of rotate(a, k) from the factors of `a`."""
+    w, F = factors
+    return w, [F[(k + j) % 4] for j in range(4)]
+
+
+def is_symmetric(a, tol=1e-12):
+    """True if a[r, d, l, u] is invariant under the rotations and reflections of the square."""
+    scale = tol * max(np.abs(a).max(), 1.0)
+    return (np.abs(a - rotate(a, 1)).max() <= scale
+            and np.abs(a - a.transpose(3, 2, 1, 0)).max() <= scale)
+
+
+class SparseTensor:
+    """
+    A local tensor a[r, d, l, u] stored as its nonzero entries: integer legs
+    `index` (n, 4) and `values` (n,). Constrained models (hard squares,
+    dimers, vertex models) have most entries structurally zero.
+
+    The absorption routines contract `a` through two unfoldings of each
+    rotation, compressed to the rows and columns that hold a nonzero:
+    `corner(k)` for (legs 0, 1 | legs 2, 3) of rotate(a, k), as in
+    `enlarged_corner`, and `edge(k)` for (leg 0 | legs 1, 2, 3), as in
+    `absorb_edge`. Slices of the environment that would only meet zeros are
+    never touched.
+    """
+
+    __slots__ = ("shape", "index", "values", "_corner", "_edge")
+
+    def __init__(self, shape, index, values):
+        self.shape = tuple(shape)
+        self.index = np.asarray(index, dtype=np.intp).reshape(-1, 4)
+        self.values = np.asarray(values)
+        self._corner, self._edge = {}, {}
+
+    @classmethod
+    def from_dense(cls, a, tol=0.0):
+        """Entries of `a` with |a| > tol times its largest entry."""
+        mask = np.abs(a) > tol * np.abs(a).max()
+        return cls(a.shape, np.argwhere(mask), a[mask])
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def density(self):
+        """Fraction of nonzero entries."""
+        return len(self.values) / np.prod(self.shape)
+
+    def todense(self):
+        a = np.zeros(self.shape, dtype=self.values.dtype)
+        a[tuple(self.index.T)] = self.values
+        return a
+
+    def astype(self, dtype):
+        return SparseTensor(self.shape, self.index, self.values.astype(dtype))
+
+    def _unfold(self, k, split):
+        # compressed (legs before `split` | legs after) matrix of rotate(a, k)
+        legs = [(k + j) % 4 for j in range(4)]
+        dims = [self.shape[leg] for leg in legs]
+        idx = self.index[:, legs]
+        row = np.ravel_multi_index(idx[:, :split].T, dims[:split])
+        col = np.ravel_multi_index(idx[:, split:].T, dims[split:])
+        rows, row_pos = np.unique(row, return_inverse=True)
+        cols, col_pos = np.unique(col, return_inverse=True)
+        block = np.zeros((len(rows), len(cols)), dtype=self.values.dtype)
+        np.add.at(block, (row_pos, col_pos), self.values)
+        return rows, cols, block
+
+    def corner(self, k):
+        """(rows, cols, block): rotate(a, k) as a (d0 d1, d2 d3) matrix, restricted to nonzero rows and columns."""
+        if k not in self._corner:
+            self._corner[k] = self._unfold(k, 2)
+        return self._corner[k]
+
+    def edge(self, k):
+        """(rows, cols, block): rotate(a, k) as a (d0, d1 d2 d3) matrix, restricted likewise."""
+        if k not in self._edge:
+            self._edge[k] = self._unfold(k, 1)
+        return self._edge[k]
+
+
+# ============================================================
+# Truncated SVD backends
+# ============================================================
+
+def _svd_lapack(driver):
+    def svd(M, k):
+        U, s, Vh = scipy.linalg.svd(M, full_matrices=False, lapack_driver=driver,
+                                    check_finite=False)
+        return U[:, :k], s[:k], Vh[:k]
+    return svd
+
+
+def _svd_lanczos(M, k):
+    if k >= min(M.shape) - 1:
+        return _svd_lapack('gesdd')(M, k)
+    U, s, Vh = svds(M, k=k)
+    order = np.argsort(s)[::-1]
+    return U[:, order], s[order], Vh[order]
+
+
+def _svd_eigh(M, k):
+    # eigh of the smaller Gram matrix; squares the condition number, so
+    # singular values below sqrt(eps) s_0 are noise and are dropped (fewer
+    # than k triplets may come back)
+    wide = M.shape[0] <= M.shape[1]
+    G = M @ M.T if wide else M.T @ M
+    lam, X = scipy.linalg.eigh(G, check_finite=False)
+    lam, X = lam[::-1][:k], X[:, ::-1][:, :k]
+    s = np.sqrt(np.clip(lam, 0.0, None))
+    keep = max(1, int(np.count_nonzero(s > np.sqrt(np.finfo(M.dtype).eps) * s[0])))
+    s, X = s[:keep], X[:, :keep]
+    inv = 1.0 / s if s[0] > 0 else np.zeros_like(s)
+    if wide:
+        return X, s, (X.T @ M) * inv[:, None]
+    return (M @ X) * inv[None, :], s, X.T
+
+
+def _svd_randomized(M, k, oversample=10, n_iter=2, rng=None):
+    # Halko-Martinsson-Tropp range finder with power iterations
+    n = min(k + oversample, *M.shape)
+    rng = np.random.default_rng(rng)
+    Y = M @ rng.standard_normal((M.shape[1], n))
+    for _ in range(n_iter):
+        Y, _ = np.linalg.qr(Y)
+        Y = M @ (M.T @ Y)
+    Q, _ = np.linalg.qr(Y)
+    Ub, s, Vh = np.linalg.svd(Q.T @ M, full_matrices=False)
+    return (Q @ Ub)[:, :k], s[:k], Vh[:k]
+
+
+SVD_BACKENDS = {
+    "gesdd": _svd_lapack('gesdd'),
+    "gesvd": _svd_lapack('gesvd'),
+    "eigh": _svd_eigh,
+    "randomized": _svd_randomized,
+    "lanczos": _svd_lanczos,
+}
+
+
+def truncated_svd(M, k, backend="gesdd"):
+    """
+        truncated_svd(M, k, backend="gesdd") -> (U, s, Vh)
+
+    The k leading singular triplets of the matrix M, singular values in
+    descending order ("eigh" returns fewer if the rest are below its
+    sqrt(eps) s_0 noise floor). `backend` names an entry of SVD_BACKENDS, or is "auto"
+    to use the backend `autotuner()` picked for this shape.
+    """
+    k = min(k, *M.shape)
+    if backend == "auto":
+        backend = autotuner().backend(M, k)
+    return SVD_BACKENDS[backend](M, k)
+
+
+# ============================================================
+# SVD autotuner
+# ============================================================
+
+AUTOTUNE_CACHE = os.environ.get(
+    "CTMRG_SVD_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "ctmrg", "svd_backends.json"))
+
+
+def _machine_key():
+    # timings are only comparable on the same machine and linear algebra build
+    return f"{platform.machine()}-{platform.node()}-numpy{np.__version__}-scipy{scipy.__version__}"
+
+
+class SVDAutotuner:
+    """
+    Picks the fastest SVD backend per (shape, k, dtype) and remembers it.
+
+    On the first truncation of a given kind every candidate is timed on the
+    matrix at hand (best of `repeats`). A candidate only qualifies if the
+    oblique projectors built from its triplets are as good as those from
+    "gesdd": S^-1/2 (U^T M V - S) S^-1/2 may not exceed `rtol` or 100 times the
+    reference value, both on the matrix at hand and on a matrix of the same
+    shape whose spectrum spans 14 decades like a converged CTMRG cut (this
+    rules out the Gram-matrix "eigh" for wide spectra). The winner
+    is stored in the JSON file `path` under a key for this machine and its
+    numpy/scipy build, so later runs dispatch to it without timing.
+    """
+
+    def __init__(self, path=AUTOTUNE_CACHE, candidates=tuple(SVD_BACKENDS), rtol=1e-8,
+                 repeats=3):
+        self.path = path
+        self.candidates = tuple(candidates)
+        self.rtol = rtol
+        self.repeats = repeats
+        self.table = self._load().get(_machine_key(), {})
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        if self.path is None:
+            return
+        data = self._load()
+        data[_machine_key()] = self.table
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def key(M, k):
+        return f"{M.shape[0]}x{M.shape[1]}:{k}:{M.dtype}"
+
+    def backend(self, M, k):
+        """Name of the backend for truncating M to rank k, tuning on a cache miss."""
+        key = self.key(M, k)
+        if key not in self.table:
+            self.table[key] = self.tune(M, k)["best"]
+            self._save()
+        return self.table[key]
+
+    def tune(self, M, k):
+        """
+            tune(M, k) -> dict
+
+        Time every candidate on M; returns {"best": name, "times": {name: seconds}}
+        with infinite times for backends that failed the accuracy check.
+        """
+        tests = [(A, _projector_error(A, *SVD_BACKENDS["gesdd"](A, k)))
+                 for A in (M, _graded_matrix(M.shape, M.dtype))]
+        times = {}
+        for name in self.candidates:
+            svd = SVD_BACKENDS[name]
+            best = np.inf
+            try:
+                for _ in range(self.repeats):
+                    t0 = time.perf_counter()
+                    svd(M, k)
+                    best = min(best, time.perf_counter() - t0)
+                accurate = all(_projector_error(A, *svd(A, k)) <= max(self.rtol, 100 * ref)
+                               for A, ref in tests)
+            except (np.linalg.LinAlgError, ValueError, RuntimeError):
+                accurate = False
+            times[name] = best if accurate else np.inf
+        finite = {name: t for name, t in times.items() if np.isfinite(t)}
+        return {"best": min(finite, key=finite.get) if finite else "gesdd", "times": times}
+
+
+def _graded_matrix(shape, dtype, decades=14.0, seed=0):
+    # random singular vectors, singular values spread evenly over `decades`
+    # decades: the spectrum of a converged CTMRG cut
+    rng = np.random.default_rng(seed)
+    n = min(shape)
+    U, _ = np.linalg.qr(rng.standard_normal((shape[0], n)))
+    V, _ = np.linalg.qr(rng.standard_normal((shape[1], n)))
+    return ((U * np.logspace(0, -decades, n)) @ V.T).astype(dtype)
+
+
+def _projector_error(M, U, s, Vh, cutoff=1e-14):
+    # max |S^-1/2 (U^T M V - S) S^-1/2| over the triplets `projectors` keeps:
+    # the deviation of Pt P from the identity
+    keep = s > cutoff * s[0]
+    U, s, Vh = U[:, keep], s[keep], Vh[keep]
+    inv = 1.0 / np.sqrt(s)
+    E = (U.T @ M @ Vh.T - np.diag(s)) * inv[:, None] * inv[None, :]
+    return np.abs(E).max()
+
+
+_AUTOTUNER = None
+
+
+def autotuner():
+    """The process-wide `SVDAutotuner` used by backend="auto"."""
+    global _AUTOTUNER
+    if _AUTOTUNER is None:
+        _AUTOTUNER = SVDAutotuner()
+    return _AUTOTUNER
+
+
+# ============================================================
+# Network contraction
+# ============================================================
+
+NCON_EXHAUSTIVE = 8
+NCON_PLANS = {}     # (labels, shapes) -> (path, flops)
+
+
+def _open_legs(legs, where, S):
+    # labels of the merged tensor S that stay open: output labels and bonds to tensors outside S
+    return frozenset(x for x in legs if x < 0 or where[x] & ~S)
+
+
+def _size(legs, dims):
+    size = 1
+    for x in legs:
+        size *= dims[x]
+    return size
+
+
+def _optimal_order(legs, dims, where):
+    # dynamic programming over subsets; submasks are numerically smaller, so
+    # visiting S in increasing order sees every part before the whole
+    n = len(legs)
+    best = {1 << i: (0, None, legs[i]) for i in range(n)}
+    for S in range(1, 1 << n):
+        if S in best:
+            continue
+        low = S & -S
+        choice = None
+        A = (S - 1) & S
+        while A:
+            if A & low:
+                cost_a, _, la = best[A]
+                cost_b, _, lb = best[S ^ A]
+                flops = cost_a + cost_b + _size(la | lb, dims)
+                if choice is None or flops < choice[0]:
+                    choice = (flops, (A, S ^ A), la | lb)
+            A = (A - 1) & S
+        best[S] = (choice[0], choice[1], _open_legs(choice[2], where, S))
+
+    pairs, current = [], [1 << i for i in range(n)]
+
+    def emit(S):
+        split = best[S][1]
+        if split is None:
+            return
+        emit(split[0])
+        emit(split[1])
+        i, j = current.index(split[0]), current.index(split[1])
+        pairs.append((i, j))
+        current[:] = [x for x in current if x not in split] + [S]
+
+    emit((1 << n) - 1)
+    return pairs, best[(1 << n) - 1][0]
+
+
+def _greedy_order(legs, dims, where):
+    # cheapest connected pair first; disconnected parts are joined last, smallest first
+    current = [(1 << i, legs[i]) for i in range(len(legs))]
+    pairs, total = [], 0
+    while len(current) > 1:
+        choice = None
+        for i in range(len(current)):
+            for j in range(i + 1, len(current)):
+                (Sa, la), (Sb, lb) = current[i], current[j]
+                connected = bool(la & lb)
+                flops = _size(la | lb, dims)
+                key = (not connected, flops)
+                if choice is None or key < choice[0]:
+                    choice = (key, i, j, flops)
+        _, i, j, flops = choice
+        S = current[i][0] | current[j][0]
+        merged = _open_legs(current[i][1] | current[j][1], where, S)
+        current = [x for k, x in enumerate(current) if k not in (i, j)] + [(S, merged)]
+        pairs.append((i, j))
+        total += flops
+    return pairs, total
+
+
+def _plan(labels, shapes):
+    plan = NCON_PLANS.get((labels, shapes))
+    if plan is None:
+        plan = NCON_PLANS[labels, shapes] = _search(labels, shapes)
+    return plan
+
+
+def _search(labels, shapes):
+    dims, where = {}, {}
+    for i, (lab, shape) in enumerate(zip(labels, shapes)):
+        for x, dim in zip(lab, shape):
+            dims[x] = dim
+            where[x] = where.get(x, 0) | (1 << i)
+    legs = [frozenset(lab) for lab in labels]
+    if len(legs) == 1:
+        return (), 0
+    order = _optimal_order if len(legs) <= NCON_EXHAUSTIVE else _greedy_order
+    pairs, flops = order(legs, dims, where)
+    return tuple(pairs), flops
+
+
+def _check_labels(labels):
+    count = {}
+    for lab in labels:
+        for x in lab:
+            count[x] = count.get(x, 0) + 1
+    for x, c in count.items():
+        if x == 0 or (x < 0 and c != 1) or (x > 0 and c != 2):
+            raise ValueError(f"label {x} appears {c} times; contracted labels must be "
+                             "positive and appear twice, open labels negative and once")
+    open_labels = sorted((x for x in count if x < 0), reverse=True)
+    if open_labels != list(range(-1, -len(open_labels) - 1, -1)):
+        raise ValueError("open labels must be -1, -2, ..., -n")
+
+
+def _trace_repeated(t, lab):
+    # sum over labels repeated within one tensor
+    lab = list(lab)
+    for x in set(lab):
+        if lab.count(x) == 2:
+            i = lab.index(x)
+            j = lab.index(x, i + 1)
+            t = np.trace(t, axis1=i, axis2=j)
+            lab = [y for k, y in enumerate(lab) if k not in (i, j)]
+    return t, tuple(lab)
+
+
+def contraction_path(labels, shapes):
+    """
+        contraction_path(labels, shapes) -> (path, flops)
+
+    Pairwise contraction order for `ncon` (labels after removing traces):
+    `path` lists pairs (i, j) of positions in the current list of tensors,
+    each contracted into a new tensor appended at the end, and `flops` counts
+    the multiply-adds. The order is optimal (dynamic programming over subsets)
+    for up to NCON_EXHAUSTIVE tensors and greedy beyond; plans are memoized by
+    labels and shapes in NCON_PLANS.
+    """
+    path, flops = _plan(tuple(map(tuple, labels)), tuple(map(tuple, shapes)))
+    return list(path), flops
+
+
+def ncon(tensors, labels):
+    """
+        ncon(tensors, labels) -> ndarray
+
+    Contract a tensor network given in the ncon convention: labels[i] names the
+    legs of tensors[i]; a positive label appears on exactly two legs, which
+    are summed over (on the same tensor it is a trace), and the negative
+    labels -1, -2, ... are the open legs of the result, in that order. The
+    pairwise order comes from `contraction_path`, so the search runs once per
+    network structure and shapes and repeated calls only pay for `tensordot`.
+    """
+    if len(tensors) != len(labels):
+        raise ValueError("one label list per tensor")
+    _check_labels(labels)
+    for t, lab in zip(tensors, labels):
+        if t.ndim != len(lab):
+            raise ValueError(f"tensor of rank {t.ndim} with {len(lab)} labels")
+    pairs = [_trace_repeated(t, lab) for t, lab in zip(tensors, labels)]
+    tensors, labels = [p[0] for p in pairs], [p[1] for p in pairs]
+    path, _ = _plan(tuple(labels), tuple(t.shape for t in tensors))
+    for i, j in path:
+        (ta, la), (tb, lb) = (tensors[i], labels[i]), (tensors[j], labels[j])
+        shared = [x for x in la if x in lb]
+        t = np.tensordot(ta, tb, axes=([la.index(x) for x in shared],
+                                       [lb.index(x) for x in shared]))
+        lab = tuple(x for x in la if x not in shared) + tuple(x for x in lb if x not in shared)
+        keep = [k for k in range(len(tensors)) if k not in (i, j)]
+        tensors = [tensors[k] for k in keep] + [t]
+        labels = [labels[k] for k in keep] + [lab]
+    t, lab = tensors[0], labels[0]
+    return np.transpose(t, [lab.index(-k) for k in range(1, len(lab) + 1)])
+
+
+# ============================================================
+# Environment
+# ============================================================
+
+class Environment:
+    """
+    Corner matrices C = [C1, C2, C3, C4] and edge tensors T = [T1, T2, T3, T4].
+
+    All eight arrays are views into one contiguous `block`, so an environment
+    is a single allocation that can be copied, saved or recycled as a whole.
+    The tensors passed in are copied into the block (into `block` itself if
+    it is given and large enough).
+    """
+
+    __slots__ = ("C", "T", "block")
+
+    def __init__(self, C, T, block=None):
+        C, T = list(C), list(T)
+        self._bind([c.shape for c in C], [t.shape for t in T],
+                   np.result_type(*C, *T), block)
+        for view, x in zip(self.C + self.T, C + T):
+            view[...] = x
+
+    @classmethod
+    def empty(cls, c_shapes, t_shapes, dtype=float, block=None):
+        """Uninitialized environment with the given shapes, laid out in `block` if possible."""
+        env = cls.__new__(cls)
+        env._bind(c_shapes, t_shapes, dtype, block)
+        return env
+
+    def _bind(self, c_shapes, t_shapes, dtype, block):
+        shapes = list(c_shapes) + list(t_shapes)
+        sizes = [int(np.prod(shape)) for shape in shapes]
+        if block is None or block.size < sum(sizes) or block.dtype != dtype:
+            block = np.empty(sum(sizes), dtype=dtype)
+        self.block = block
+        views, start = [], 0
+        for shape, size in zip(shapes, sizes):
+            views.append(block[start:start + size].reshape(shape))
+            start += size
+        self.C, self.T = views[:4], views[4:]
+
+    @property
+    def chi(self):
+        return self.C[0].shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(x.nbytes for x in self.C + self.T)
+
+    def copy(self):
+        return Environment(self.C, self.T)
+
+    def astype(self, dtype):
+        """Copy with every tensor converted to `dtype`."""
+        env = Environment.empty([c.shape for c in self.C], [t.shape for t in self.T], dtype)
+        env.block[...] = self.block[:env.block.size]
+        return env
+
+
+def initial_environment(lt, kind="open", rng=None):
+    """
+        initial_environment(lt, kind="open", rng=None) -> Environment
+
+    Environment of a single site: C_i and T_i are `a` with its outward legs
+    closed by `lt.boundary(kind)` ("open" or "fixed"). With kind="random" the
+    tensors have bond dimension d and random entries.
+    """
+    a, d = lt.a, lt.d
+    if kind == "random":
+        rng = np.random.default_rng(rng)
+        C = [rng.random((d, d)) for _ in range(4)]
+        T = [rng.random((d, d, d)) for _ in range(4)]
+        return Environment(C, T)
+    caps = lt.boundary(kind)
+    C, T = [], []
+    for i in range(4):
+        # outward legs of corner i are i-1 and i; of edge i, leg i
+        ai = rotate(a, i)
+        Ti = np.tensordot(ai, caps[i], axes=([0], [0]))               # [i+1, i+2, i-1]
+        T.append(Ti.transpose(2, 1, 0))
+        Ci = np.tensordot(rotate(a, i - 1), caps[(i - 1) % 4], axes=([0], [0]))
+        Ci = np.tensordot(Ci, caps[i], axes=([0], [0]))                # [i+1, i+2]
+        C.append(Ci.T)
+    return Environment(C, T)
+
+
+def _normalize(x):
+    return x / np.abs(x).max()
+
+
+def _absmax(x):
+    # max |x| without the temporary of np.abs
+    return max(x.max(), -x.min())
+
+
+# ============================================================
+# Enlarged corners and projectors
+# ============================================================
+
+def enlarged_corner(env, a, i, factors=None, rows=None):
+    """
+        enlarged_corner(env, a, i, factors=None, rows=None) -> ndarray (chi*d, chi*d)
+
+    Q_i = T_{i-1} C_i T_i a around corner C_i, as a matrix from the cut it shares
+    with Q_{i-1} (rows) to the cut it shares with Q_{i+1} (columns). Both cuts
+    are indexed by (chi bond of the edge, d bond of a).
+
+    With `factors` (see `LocalTensors.factors`) `a` is never formed: the two
+    bond factors facing the edges are absorbed one at a time, the site sum stays
+    a diagonal index s, and the two outward factors are attached last, which
+    replaces the chi^2 d^4 contraction by chi^2 d^3 ones.
+
+    A `SparseTensor` is contracted through its compressed corner unfolding,
+    which skips the (d, d) pairs of the edge legs that only meet zeros.
+
+    `rows` (a slice of the chi bond of T_{i-1}) restricts Q_i to the
+    corresponding block of rows.
+    """
+    Tp, C, Tn = env.T[(i - 1) % 4], env.C[i], env.T[i]
+    if rows is not None:
+        Tp = Tp[rows]
+    if not isinstance(a, SparseTensor) and factors is None:
+        # Tp[A, e, q] C[q, r] Tn[r, f, N] a[e, f, g, h]  ->  [A, h, N, g]
+        x = ncon([Tp, C, Tn, rotate(a, i - 1)], [[-1, 1, 2], [2, 3], [3, 4, -3], [1, 4, -4, -2]])
+        return x.reshape(x.shape[0] * x.shape[1], x.shape[2] * x.shape[3])
+    x = np.tensordot(Tp, C, axes=([2], [0]))                     # [A, e, q]
+    x = np.tensordot(x, Tn, axes=([2], [0]))                     # [A, e, f, N]
+    if isinstance(a, SparseTensor):
+        A, e, f, N = x.shape
+        x = _sparse_product(x.reshape(A, e * f, N), a.corner((i - 1) % 4),
+                            _rotated_shape(a, i - 1)[2:])               # [A, N, g, h]
+    else:
+        w, F = rotate_factors(factors, i - 1)
+        x = np.tensordot(x, F[0], axes=([1], [1]))               # [A, f, N, s]
+        x = np.sum(x * (w[:, None] * F[1]).T[None, :, None, :], axis=1)   # [A, N, s]
+        outer = F[2][:, :, None] * F[3][:, None, :]              # [s, g, h]
+        x = np.tensordot(x, outer, axes=([2], [0]))              # [A, N, g, h]
+    chi_in, chi_out = x.shape[0], x.shape[1]
+    d_out, d_in = x.shape[2], x.shape[3]
+    return x.transpose(0, 3, 1, 2).reshape(chi_in * d_in, chi_out * d_out)
+
+
+@dataclass
+class SubspaceRecycler:
+    """
+    Right singular subspaces of the four cuts from the previous CTMRG step.
+    Passed to `ctmrg`, it replaces the full SVD of every cut by `n_iter` block
+    power iterations from the stored subspace and a Rayleigh-Ritz step; the full
+    SVD is used when the residual exceeds `threshold` (relative to s_0), when
+    the shape of the cut changed, and in the first step. `full` and `recycled`
+    count the two outcomes.
+    """
+    n_iter: int = 2
+    threshold: float = 1e-8
+    V: list = field(default_factory=lambda: [None] * 4)
+    full: int = 0
+    recycled: int = 0
+    rng: np.random.Generator = field(default_factory=np.random.default_rng)
+
+
+def subspace_svd(M, V0, n_iter=2):
+    """
+        subspace_svd(M, V0, n_iter=2) -> (U, s, Vh, residual)
+
+    Rank-k SVD of M from the right subspace V0 (n x k) by block power
+    iteration and Rayleigh-Ritz. `residual` = max_j |M^T u_j - s_j v_j| / s_0;
+    it is small once V0 spans the leading right singular vectors.
+    """
+    V, _ = np.linalg.qr(V0)
+    for _ in range(n_iter):
+        U, _ = np.linalg.qr(M @ V)
+        V, _ = np.linalg.qr(M.T @ U)
+    Z = M @ V
+    U, _ = np.linalg.qr(Z)
+    Ub, s, Vbh = np.linalg.svd(U.T @ Z)
+    U, V = U @ Ub, V @ Vbh.T
+    residual = np.linalg.norm(M.T @ U - V * s, axis=0).max() / s[0]
+    return U, s, V.T, residual
+
+
+def projectors(Q, k, chi, backend="gesdd", cutoff=1e-14, recycler=None, workspace=None):
+    """
+        projectors(Q, k, chi, backend="gesdd", cutoff=1e-14, recycler=None,
+                   workspace=None) -> (P, Pt, s, trunc_err)
+
+    Oblique projectors for the cut between Q_k and Q_{k+1}. With the two halves
+    X = Q_{k+1} Q_{k+2} and Y = Q_{k+3} Q_k of the 2x2 cluster and the SVD
+    Y X = U S V^T truncated to chi,
+
+        P = X V S^(-1/2),     Pt = S^(-1/2) U^T Y,
+
+    so that Y P Pt X is the best rank-chi approximation of Y X. Singular values
+    below `cutoff` relative to the largest are dropped as well. `s` are the
+    normalized singular values of the cut and `trunc_err` the discarded weight.
+    With a `SubspaceRecycler` the SVD starts from the subspace of the previous
+    step, and the signs of the singular vectors are aligned with it so that
+    the gauge of the environment stays continuous between steps. With a
+    `Workspace`, X, Y, Y X, P and Pt are written into its buffers.
+    """
+    ws = workspace
+    Q1, Q2, Q3, Q0 = Q[(k + 1) % 4], Q[(k + 2) % 4], Q[(k + 3) % 4], Q[k]
+    if ws is None:
+        X = Q1 @ Q2
+        Y = Q3 @ Q0
+        X = X / np.abs(X).max()
+        Y = Y / np.abs(Y).max()
+        M = Y @ X
+    else:
+        X = np.matmul(Q1, Q2, out=ws.take("X", (Q1.shape[0], Q2.shape[1])))
+        Y = np.matmul(Q3, Q0, out=ws.take("Y", (Q3.shape[0], Q0.shape[1])))
+        X /= _absmax(X)
+        Y /= _absmax(Y)
+        M = np.matmul(Y, X, out=ws.take("M", (Y.shape[0], X.shape[1])))
+    V0 = None if recycler is None else recycler.V[k]
+    U = None
+    if V0 is not None and V0.shape[0] == M.shape[1]:
+        # directions dropped by the cutoff last time may be needed now
+        pad = min(chi, M.shape[1]) - V0.shape[1]
+        start = np.hstack([V0, recycler.rng.standard_normal((M.shape[1], pad))])
+        U, s, Vh, residual = subspace_svd(M, start, recycler.n_iter)
+        if residual > recycler.threshold:
+            U = None
+        else:
+            recycler.recycled += 1
+    if U is None:
+        U, s, Vh = truncated_svd(M, chi, backend)
+        if recycler is not None:
+            recycler.full += 1
+    if V0 is not None and V0.shape[0] == Vh.shape[1]:
+        n = min(V0.shape[1], len(s))
+        signs = np.ones(len(s))
+        signs[:n] = np.where(np.sum(V0[:, :n] * Vh[:n].T, axis=0) < 0, -1.0, 1.0)
+        U, Vh = U * signs, signs[:, None] * Vh
+    total = np.linalg.norm(M) ** 2
+    s_norm = s / s[0]
+    keep = max(1, int(np.count_nonzero(s_norm > cutoff)))
+    U, s, Vh = U[:, :keep], s[:keep], Vh[:keep]
+    if recycler is not None:
+        recycler.V[k] = Vh.T
+    inv_sqrt = 1.0 / np.sqrt(s)
+    if ws is None:
+        P = (X @ Vh.T) * inv_sqrt[None, :]
+        Pt = inv_sqrt[:, None] * (U.T @ Y)
+    else:
+        P = np.matmul(X, Vh.T, out=ws.take(f"P{k}", (X.shape[0], keep)))
+        Pt = np.matmul(U.T, Y, out=ws.take(f"Pt{k}", (keep, Y.shape[1])))
+        P *= inv_sqrt[None, :]
+        Pt *= inv_sqrt[:, None]
+    trunc_err = max(0.0, 1.0 - np.sum(s ** 2) / total) if total > 0 else 0.0
+    return P, Pt, s_norm[:keep], trunc_err
+
+
+def _rotated_shape(a, k):
+    return tuple(a.shape[(k + j) % 4] for j in range(4))
+
+
+def _sparse_product(x, unfolding, out_dims):
+    # x[A, K, B] with K the flattened contracted legs, times a compressed
+    # unfolding of `a` -> [A, B, *out_dims]; columns without nonzeros stay zero
+    rows, cols, block = unfolding
+    y = np.tensordot(x[:, rows, :], block, axes=([1], [0]))     # [A, B, nc]
+    out = np.zeros(y.shape[:2] + (int(np.prod(out_dims)),), dtype=y.dtype)
+    out[:, :, cols] = y
+    return out.reshape(y.shape[:2] + tuple(out_dims))
+
+
+def absorb_edge(T, a, k):
+    """
+        absorb_edge(T, a, k) -> ndarray (chi*d, d, chi*d)
+
+    Edge T_{k+1} with one more copy of `a` absorbed; the prev and next legs
+    become (chi, d) pairs matching the cut index of `enlarged_corner`. A
+    `SparseTensor` is contracted through its compressed edge unfolding.
+    """
+    if isinstance(a, SparseTensor):
+        x = _sparse_product(T, a.edge(k % 4), _rotated_shape(a, k)[1:])
+    else:
+        x = np.tensordot(T, rotate(a, k), axes=([1], [0]))       # [p, n, k+1, k+2, k-1]
+    chi_p, chi_n, d_n, d_c, d_p = x.shape
+    return x.transpose(0, 4, 3, 1, 2).reshape(chi_p * d_p, d_c, chi_n * d_n)
+
+
+def absorb_edge_factored(T, factors, k, P, Pt):
+    """
+        absorb_edge_factored(T, factors, k, P, Pt) -> ndarray (chi', d, chi')
+
+    Pt (T_{k+1} a) P without forming `a` or the enlarged edge: the three bond
+    factors on the edge, prev and next legs are absorbed into T, Pt and P, and
+    the projectors are applied as a batch of chi x chi products over the site
+    index s. Costs O(chi^3 d) instead of O(chi^3 d^3).
+    """
+    w, F = rotate_factors(factors, k)
+    chi_p, _, chi_n = T.shape
+    Pt = Pt.reshape(Pt.shape[0], chi_p, -1)
+    P = P.reshape(chi_n, -1, P.shape[1])
+    y = np.tensordot(T, F[0], axes=([1], [1])).transpose(2, 0, 1)     # [s, p, n]
+    left = np.tensordot(Pt, F[3], axes=([2], [1])).transpose(2, 0, 1)  # [s, a, p]
+    right = np.tensordot(P, F[1], axes=([1], [1])).transpose(2, 0, 1)  # [s, n, b]
+    x = (left @ y @ right) * w[:, None, None]                          # [s, a, b]
+    return np.tensordot(x, F[2], axes=([0], [0])).transpose(0, 2, 1)
+
+
+def ctmrg_step(env, a, chi, backend="gesdd", factors=None, recycler=None, workspace=None):
+    """
+        ctmrg_step(env, a, chi, backend="gesdd", factors=None, recycler=None,
+                   workspace=None) -> (Environment, spectra, trunc_err)
+
+    One simultaneous CTMRG iteration in all four directions. Returns the new
+    environment, the normalized singular values of the four cuts and the
+    largest truncation error. With `factors` the local tensor is absorbed in
+    its factored form (`enlarged_corner`, `absorb_edge_factored`); with a
+    `SubspaceRecycler` the projectors are warm-started from the previous step.
+    With a `Workspace` the step runs in its preallocated buffers
+    (`ctmrg_step_inplace`), with an `OutOfCore` block by block through
+    memory-mapped buffers (`ctmrg_step_chunked`).
+    """
+    if isinstance(workspace, OutOfCore):
+        if factors is not None or recycler is not None:
+            raise ValueError("the out-of-core path supports neither factors nor recycling")
+        return ctmrg_step_chunked(env, a, chi, workspace, backend)
+    if workspace is not None:
+        if factors is not None or isinstance(a, SparseTensor):
+            raise ValueError("the workspace path absorbs the dense local tensor only")
+        return ctmrg_step_inplace(env, a, chi, workspace, backend, recycler)
+    Q = [enlarged_corner(env, a, i, factors) for i in range(4)]
+    P, Pt, spectra, err = [], [], [], 0.0
+    for k in range(4):
+        p, pt, s, e = projectors(Q, k, chi, backend, recycler=recycler)
+        P.append(p)
+        Pt.append(pt)
+        spectra.append(s)
+        err = max(err, e)
+    C = [_normalize(Pt[(i - 1) % 4] @ Q[i] @ P[i]) for i in range(4)]
+    T = []
+    for k in range(4):
+        if factors is not None:
+            T.append(_normalize(absorb_edge_factored(env.T[k], factors, k, P[k], Pt[k])))
+            continue
+        Tk = absorb_edge(env.T[k], a, k)
+        Tk = np.tensordot(Pt[k], Tk, axes=([1], [0]))
+        Tk = np.tensordot(Tk, P[k], axes=([2], [0]))
+        T.append(_normalize(Tk))
+    return Environment(C, T), spectra, err
+
+
+# ============================================================
+# Workspace arena
+# ============================================================
+
+class Workspace:
+    """
+    Scratch buffers for `ctmrg_step_inplace`, allocated once for bond
+    dimension chi and leg dimension D of the local tensor.
+
+    Every intermediate of a step (the contractions building Q_i, the halves X
+    and Y, the projectors, the enlarged edges) is a view into a named flat
+    buffer, and the environment alternates between two preallocated blocks, so
+    a steady-state step creates no new arrays apart from the outputs of the
+    LAPACK SVD. A buffer that turns out too small (an environment with a
+    larger chi) is regrown once.
+    """
+
+    __slots__ = ("chi", "D", "dtype", "buffers", "blocks", "a", "a_corner", "a_edge")
+
+    def __init__(self, chi, D, dtype=float):
+        self.chi, self.D, self.dtype = chi, D, np.dtype(dtype)
+        self.buffers = {}
+        self.a = None
+        n = chi * D
+        for name, shape in [("x1", (n, chi)), ("x2", (n, n)), ("x3", (chi * chi, D * D)),
+                            ("x4", (chi * chi, D * D)), ("X", (n, n)), ("Y", (n, n)),
+                            ("M", (n, n)), ("cq", (chi, n)), ("t", (chi * chi, D)),
+                            ("edge", (chi * chi, D ** 3)), ("edge_t", (n, D, n)),
+                            ("edge_pt", (chi, D * n))]:
+            self.take(name, shape)
+        for k in range(4):
+            self.take(f"Q{k}", (n, n))
+            self.take(f"P{k}", (n, chi))
+            self.take(f"Pt{k}", (chi, n))
+        size = 4 * chi * chi + 4 * chi * D * chi
+        self.blocks = [np.empty(size, self.dtype), np.empty(size, self.dtype)]
+
+    @property
+    def nbytes(self):
+        return (sum(b.nbytes for b in self.buffers.values())
+                + sum(b.nbytes for b in self.blocks))
+
+    def take(self, name, shape):
+        """View of buffer `name` with the given shape."""
+        size = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = self.buffers[name] = np.empty(size, self.dtype)
+        return buf[:size].reshape(shape)
+
+    def bind(self, a):
+        """Contiguous copies of the four rotations of `a`, shaped for the corner and edge matmuls."""
+        if a is self.a:
+            return
+        D = a.shape[0]
+        rotated = [np.ascontiguousarray(rotate(a, k), dtype=self.dtype) for k in range(4)]
+        self.a = a
+        self.a_corner = [x.reshape(D * D, D * D) for x in rotated]
+        self.a_edge = [x.reshape(D, D ** 3) for x in rotated]
+
+    def next_environment(self, env, c_shapes, t_shapes):
+        """Empty environment in whichever block `env` does not occupy."""
+        i = 1 if env.block is self.blocks[0] else 0
+        new = Environment.empty(c_shapes, t_shapes, self.dtype, self.blocks[i])
+        self.blocks[i] = new.block
+        return new
+
+
+def enlarged_corner_into(env, ws, i):
+    """`enlarged_corner(env, a, i)` written into buffer Q{i} of the workspace bound to `a`."""
+    Tp, C, Tn = env.T[(i - 1) % 4], env.C[i], env.T[i]
+    chi_A, D, chi_q = Tp.shape
+    chi_r, _, chi_N = Tn.shape
+    x1 = np.matmul(Tp.reshape(chi_A * D, chi_q), C, out=ws.take("x1", (chi_A * D, chi_r)))
+    x2 = np.matmul(x1, Tn.reshape(chi_r, D * chi_N), out=ws.take("x2", (chi_A * D, D * chi_N)))
+    x3 = ws.take("x3", (chi_A * chi_N, D * D))
+    np.copyto(x3.reshape(chi_A, chi_N, D, D), x2.reshape(chi_A, D, D, chi_N).transpose(0, 3, 1, 2))
+    x4 = np.matmul(x3, ws.a_corner[(i - 1) % 4], out=ws.take("x4", (chi_A * chi_N, D * D)))
+    Q = ws.take(f"Q{i}", (chi_A * D, chi_N * D))
+    np.copyto(Q.reshape(chi_A, D, chi_N, D), x4.reshape(chi_A, chi_N, D, D).transpose(0, 3, 1, 2))
+    return Q
+
+
+def renormalize_edge_into(T, ws, k, P, Pt, out):
+    """Pt (T_{k+1} a) P written into `out`, with the enlarged edge in workspace buffers."""
+    chi_p, D, chi_n = T.shape
+    t = ws.take("t", (chi_p * chi_n, D))
+    np.copyto(t.reshape(chi_p, chi_n, D), T.transpose(0, 2, 1))
+    x = np.matmul(t, ws.a_edge[k], out=ws.take("edge", (chi_p * chi_n, D ** 3)))
+    y = ws.take("edge_t", (chi_p * D, D, chi_n * D))
+    np.copyto(y.reshape(chi_p, D, D, chi_n, D),
+              x.reshape(chi_p, chi_n, D, D, D).transpose(0, 4, 3, 1, 2))
+    z = np.matmul(Pt, y.reshape(chi_p * D, D * chi_n * D),
+                  out=ws.take("edge_pt", (Pt.shape[0], D * chi_n * D)))
+    np.matmul(z.reshape(Pt.shape[0] * D, chi_n * D), P,
+              out=out.reshape(Pt.shape[0] * D, P.shape[1]))
+    out /= _absmax(out)
+    return out
+
+
+def ctmrg_step_inplace(env, a, chi, ws, backend="gesdd", recycler=None):
+    """
+        ctmrg_step_inplace(env, a, chi, ws, backend="gesdd", recycler=None)
+            -> (Environment, spectra, trunc_err)
+
+    `ctmrg_step` run entirely in the buffers of the `Workspace` ws. The
+    returned environment lives in one of the two blocks of ws and is
+    overwritten two steps later; copy it to keep it.
+    """
+    ws.bind(a)
+    D = a.shape[0]
+    Q = [enlarged_corner_into(env, ws, i) for i in range(4)]
+    P, Pt, spectra, err = [], [], [], 0.0
+    for k in range(4):
+        p, pt, s, e = projectors(Q, k, chi, backend, recycler=recycler, workspace=ws)
+        P.append(p)
+        Pt.append(pt)
+        spectra.append(s)
+        err = max(err, e)
+    new = ws.next_environment(
+        env,
+        [(Pt[(i - 1) % 4].shape[0], P[i].shape[1]) for i in range(4)],
+        [(Pt[k].shape[0], D, P[k].shape[1]) for k in range(4)])
+    for i in range(4):
+        cq = np.matmul(Pt[(i - 1) % 4], Q[i], out=ws.take("cq", (Pt[(i - 1) % 4].shape[0], Q[i].shape[1])))
+        np.matmul(cq, P[i], out=new.C[i])
+        new.C[i] /= _absmax(new.C[i])
+    for k in range(4):
+        renormalize_edge_into(env.T[k], ws, k, P[k], Pt[k], new.T[k])
+    return new, spectra, err
+
+
+# ============================================================
+# Memory planning and out-of-core steps
+# ============================================================
+
+MEMORY_MODES = ("dense", "factored", "workspace", "chunked")
+
+
+@dataclass
+class MemoryPlan:
+    """Predicted peak memory of one CTMRG step, in bytes, and the largest arrays behind it."""
+    mode: str
+    peak: int
+    disk: int
+    arrays: dict
+
+
+def plan_memory(chi, D, mode="dense", dtype=float, budget=None):
+    """
+        plan_memory(chi, D, mode="dense", dtype=float, budget=None) -> MemoryPlan
+
+    Peak resident memory of a CTMRG step at bond dimension chi for a local
+    tensor with legs of dimension D, for the step variants in MEMORY_MODES:
+    "dense" and "factored" (`ctmrg_step` with absorb="dense"/"factored"),
+    "workspace" (`ctmrg_step_inplace`) and "chunked" (`ctmrg_step_chunked`
+    with an `OutOfCore` of the given budget). The counts follow the
+    intermediates of each code path; LAPACK work arrays are taken as one
+    extra matrix of the decomposed size. "chunked" keeps the n x n matrices
+    (n = chi D) on disk, which is reported in `disk`.
+    """
+    if mode not in MEMORY_MODES:
+        raise ValueError(f"unknown mode {mode!r}; expected one of {MEMORY_MODES}")
+    item = np.dtype(dtype).itemsize
+    n = chi * D
+    env = 4 * chi * chi + 4 * chi * D * chi
+    arrays = {"environment": env, "projectors": 8 * n * chi}
+    disk = 0
+    if mode == "chunked":
+        if budget is None:
+            raise ValueError("the chunked plan needs a budget")
+        # range finder panels and P, Pt before scaling; one block of rows
+        arrays["svd panels"] = 4 * n * (chi + OutOfCore.oversample)
+        arrays["chunk"] = max(budget // 4, 1) // item
+        disk = 7 * n * n
+    else:
+        arrays["corners"] = 4 * n * n
+        # X, Y, their normalized copies and Y X; U, Vh and the work array of the SVD
+        arrays["cut"] = 2 * n * n if mode == "workspace" else 4 * n * n
+        arrays["svd"] = 3 * n * n
+        if mode == "factored":
+            arrays["edge"] = 2 * chi * chi * D * D
+        else:
+            # T a before and after the transpose
+            arrays["edge"] = 2 * n * n * D
+    arrays = {name: count * item for name, count in arrays.items()}
+    peak = arrays["environment"] + arrays["projectors"]
+    if mode == "chunked":
+        peak += arrays["svd panels"] + arrays["chunk"]
+    else:
+        peak += arrays["corners"] + max(arrays["cut"] + arrays["svd"], arrays["edge"])
+    return MemoryPlan(mode=mode, peak=int(peak), disk=int(disk * item), arrays=arrays)
+
+
+class OutOfCore:
+    """
+    Disk-backed scratch space for `ctmrg_step_chunked` under a memory budget
+    of `budget` bytes.
+
+    The enlarged corners, the halves X and Y of the cut and Y X are
+    `np.memmap` files in a temporary directory below `path` (the system
+    default if None), so they live in the page cache and can be evicted
+    instead of counting against the process. Everything built from them is
+    produced in blocks of rows sized so that one block takes at most `chunk`
+    bytes (a quarter of the budget). Call `close()` to delete the files.
+    """
+
+    oversample = 10
+    n_iter = 4
+
+    def __init__(self, chi, D, budget, dtype=float, path=None):
+        self.chi, self.D, self.dtype = chi, D, np.dtype(dtype)
+        self.chunk = max(budget // 4, 1)
+        self.buffers = {}
+        self.dir = tempfile.mkdtemp(prefix="ctmrg-", dir=path)
+
+    def rows(self, row_bytes):
+        """Rows per block for blocks whose rows take `row_bytes` each."""
+        return max(1, self.chunk // max(row_bytes, 1))
+
+    def take(self, name, shape):
+        """Memory-mapped buffer `name` with the given shape, regrown if too small."""
+        size = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = self.buffers[name] = np.memmap(os.path.join(self.dir, f"{name}.bin"),
+                                                 dtype=self.dtype, mode="w+", shape=(size,))
+        return buf[:size].reshape(shape)
+
+    def close(self):
+        self.buffers = {}
+        if self.dir is not None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _blocked_matmul(A, B, out, rows):
+    # out = A @ B, `rows` rows of A at a time
+    for start in range(0, A.shape[0], rows):
+        out[start:start + rows] = A[start:start + rows] @ B
+    return out
+
+
+def _blocked_absmax(A, rows):
+    return max(_absmax(np.asarray(A[start:start + rows])) for start in range(0, A.shape[0], rows))
+
+
+def projectors_chunked(Q, k, chi, ooc, cutoff=1e-14):
+    """
+        projectors_chunked(Q, k, chi, ooc, cutoff=1e-14) -> (P, Pt, s, trunc_err)
+
+    `projectors` with X, Y and Y X formed block by block in the memory-mapped
+    buffers of `ooc`. The triplets come from the randomized range finder
+    (`ooc.n_iter` power iterations, `ooc.oversample` extra columns), which
+    only touches Y X through products with thin panels.
+    """
+    Q1, Q2, Q3, Q0 = Q[(k + 1) % 4], Q[(k + 2) % 4], Q[(k + 3) % 4], Q[k]
+    item = ooc.dtype.itemsize
+    X = _blocked_matmul(Q1, Q2, ooc.take("X", (Q1.shape[0], Q2.shape[1])),
+                        ooc.rows(item * (Q1.shape[1] + Q2.shape[1])))
+    Y = _blocked_matmul(Q3, Q0, ooc.take("Y", (Q3.shape[0], Q0.shape[1])),
+                        ooc.rows(item * (Q3.shape[1] + Q0.shape[1])))
+    for Z in (X, Y):
+        rows = ooc.rows(item * Z.shape[1])
+        scale = _blocked_absmax(Z, rows)
+        for start in range(0, Z.shape[0], rows):
+            Z[start:start + rows] /= scale
+    M = _blocked_matmul(Y, X, ooc.take("M", (Y.shape[0], X.shape[1])),
+                        ooc.rows(item * (Y.shape[1] + X.shape[1])))
+    rows = ooc.rows(item * M.shape[1])
+    total = sum(np.sum(np.asarray(M[start:start + rows]) ** 2)
+                for start in range(0, M.shape[0], rows))
+    U, s, Vh = _svd_randomized(M, min(chi, *M.shape), ooc.oversample, ooc.n_iter)
+    s_norm = s / s[0]
+    keep = max(1, int(np.count_nonzero(s_norm > cutoff)))
+    U, s, Vh = U[:, :keep], s[:keep], Vh[:keep]
+    inv_sqrt = 1.0 / np.sqrt(s)
+    P = _blocked_matmul(X, Vh.T, np.empty((X.shape[0], keep), ooc.dtype),
+                        ooc.rows(item * X.shape[1])) * inv_sqrt[None, :]
+    Pt = inv_sqrt[:, None] * (Y.T @ U).T
+    trunc_err = max(0.0, 1.0 - np.sum(s ** 2) / total) if total > 0 else 0.0
+    return P, Pt, s_norm[:keep], trunc_err
+
+
+def ctmrg_step_chunked(env, a, chi, ooc, backend="gesdd"):
+    """
+        ctmrg_step_chunked(env, a, chi, ooc, backend="gesdd") -> (Environment, spectra, trunc_err)
+
+    `ctmrg_step` for environments whose enlarged corners do not fit the memory
+    budget. The corners go to memory-mapped buffers of the `OutOfCore` ooc,
+    built a block of rows at a time (`enlarged_corner` with `rows`), the
+    projectors come from `projectors_chunked`, and the edges are absorbed a
+    block of their prev bond at a time, accumulating Pt (T a) before P is
+    applied. `backend` is unused: the cut is decomposed by the randomized
+    range finder.
+    """
+    D = a.shape[0]
+    item = ooc.dtype.itemsize
+    Q = []
+    for i in range(4):
+        chi_A, chi_N = env.T[(i - 1) % 4].shape[0], env.T[i].shape[2]
+        q = ooc.take(f"Q{i}", (chi_A * D, chi_N * D))
+        rows = ooc.rows(3 * item * D * D * chi_N)
+        for start in range(0, chi_A, rows):
+            block = slice(start, min(start + rows, chi_A))
+            q[block.start * D:block.stop * D] = enlarged_corner(env, a, i, rows=block)
+        Q.append(q)
+    P, Pt, spectra, err = [], [], [], 0.0
+    for k in range(4):
+        p, pt, s, e = projectors_chunked(Q, k, chi, ooc)
+        P.append(p)
+        Pt.append(pt)
+        spectra.append(s)
+        err = max(err, e)
+    C = []
+    for i in range(4):
+        QP = _blocked_matmul(Q[i], P[i], np.empty((Q[i].shape[0], P[i].shape[1]), ooc.dtype),
+                             ooc.rows(item * Q[i].shape[1]))
+        C.append(_normalize(Pt[(i - 1) % 4] @ QP))
+    T = []
+    for k in range(4):
+        chi_p, _, chi_n = env.T[k].shape
+        z = np.zeros((Pt[k].shape[0], D, chi_n * D), ooc.dtype)
+        rows = ooc.rows(2 * item * chi_n * D ** 3)
+        for start in range(0, chi_p, rows):
+            block = slice(start, min(start + rows, chi_p))
+            edge = absorb_edge(env.T[k][block], a, k)
+            z += np.tensordot(Pt[k][:, block.start * D:block.stop * D], edge, axes=([1], [0]))
+        T.append(_normalize(np.tensordot(z, P[k], axes=([2], [0]))))
+    return Environment(C, T), spectra, err
+
+
+# ============================================================
+# Observables
+# ============================================================
+
+@dataclass
+class Observables:
+    """
+    Free energy per site f, order parameter m, energy per site E and the
+    correlation length xi (in lattice spacings; nan where an engine has none).
+    """
+    f: float
+    m: float
+    E: float
+    xi: float = np.nan
+
+
+def environment_tensor(env):
+    """
+        environment_tensor(env) -> ndarray (d, d, d, d)
+
+    The full ring C1 T1 C2 T2 C3 T3 C4 T4 with the central site removed, with legs
+    ordered like a[r, d, l, u]; <x> = sum(E * x) / sum(E * a) for any site tensor x.
+    """
+    # bonds 1..8 clockwise from T4 -> C1; the physical leg of T_{k+1} is leg k of a
+    return ncon(list(env.C) + list(env.T),
+                [[1, 2], [3, 4], [5, 6], [7, 8],
+                 [2, -1, 3], [4, -2, 5], [6, -3, 7], [8, -4, 1]])
+
+
+def column_transfer(env, x):
+    """
+    Column transfer matrix T4 x T2 acting from left to right on vectors
+    v[chi(T4), l leg of x, chi(T2)], flattened; `x` is `a` or an impurity.
+    """
+    T2, T4 = env.T[1], env.T[3]
+    shape = (T4.shape[0], x.shape[2], T2.shape[2])
+
+    def matvec(v):
+        v = v.reshape(shape)                                      # [x, m, y]
+        y = np.tensordot(v, T4, axes=([0], [0]))                  # [m, y, u, x']
+        y = np.tensordot(y, x, axes=([0, 2], [2, 3]))             # [y, x', r, dd]
+        y = np.tensordot(y, T2, axes=([0, 3], [2, 1]))            # [x', r, y']
+        return y.reshape(-1)
+    return matvec
+
+
+def column_boundaries(env):
+    """Left column C4 T3 C3 and right column C1 T1 C2 as vectors for `column_transfer`."""
+    C1, C2, C3, C4 = env.C
+    T1, T3 = env.T[0], env.T[2]
+    left = np.tensordot(np.tensordot(C3, T3, axes=([1], [0])), C4, axes=([2], [0]))  # [y, m, x]
+    right = np.tensordot(np.tensordot(C1, T1, axes=([1], [0])), C2, axes=([2], [0]))  # [x, r, y]
+    return left.transpose(2, 1, 0).reshape(-1), right.reshape(-1)
+
+
+def correlator(env, lt, r, name="m"):
+    """
+        correlator(env, lt, r, name="m") -> float
+
+    <x_0 x_r> for two impurities `lt.impurities[name]` r sites apart in a row,
+    from the left column, r+1 column transfer matrices and the right column.
+    """
+    M = column_transfer(env, lt.a)
+    O = column_transfer(env, lt.impurities[name])
+    left, right = column_boundaries(env)
+    num, den = O(left), M(left)
+    for _ in range(r - 1):
+        num, den = M(num), M(den)
+        scale = np.abs(den).max()
+        num, den = num / scale, den / scale
+    return np.dot(O(num), right) / np.dot(M(den), right)
+
+
+def transfer_spectrum(env, a, k=2):
+    """The k eigenvalues of largest magnitude of the column transfer matrix, sorted by |lambda|."""
+    matvec = column_transfer(env, a)
+    n = env.T[3].shape[0] * a.shape[2] * env.T[1].shape[2]
+    if n <= 256:
+        M = np.stack([matvec(e) for e in np.eye(n)], axis=1)
+        vals = np.linalg.eigvals(M)
+    else:
+        op = LinearOperator((n, n), matvec=matvec, dtype=float)
+        vals = eigs(op, k=min(k, n - 2), which='LM', return_eigenvectors=False)
+    return vals[np.argsort(-np.abs(vals))][:k]
+
+
+def correlation_length(env, a, k=2):
+    """
+    xi = 1 / ln(|lambda_0| / |lambda_1|) of the column transfer matrix T4 a T2
+    acting from left to right.
+    """
+    vals = np.abs(transfer_spectrum(env, a, k))
+    if len(vals) < 2 or vals[1] == 0:
+        return 0.0
+    return 1.0 / np.log(vals[0] / vals[1])
+
+
+def observables(env, lt, xi=True):
+    """
+        observables(env, lt, xi=True) -> Observables
+
+    f from the ratio kappa = Z(1x1) Z(0x0) / (Z(1x0) Z(0x1)) of the environment
+    closed around one site, around nothing, and around a single row or column
+    (the partition function per site); m and E from the impurity tensors of `lt`.
+    """
+    C1, C2, C3, C4 = env.C
+    T1, T2, T3, T4 = env.T
+    E = environment_tensor(env)
+    z_site = np.sum(E * lt.a)
+    z_corner = np.trace(C1 @ C2 @ C3 @ C4)
+    right = np.tensordot(np.tensordot(C1, T1, axes=([1], [0])), C2, axes=([2], [0]))
+    left = np.tensordot(np.tensordot(C3, T3, axes=([1], [0])), C4, axes=([2], [0]))
+    z_h = np.tensordot(right, left, axes=([0, 1, 2], [2, 1, 0]))
+    top = np.tensordot(np.tensordot(C4, T4, axes=([1], [0])), C1, axes=([2], [0]))
+    bottom = np.tensordot(np.tensordot(C2, T2, axes=([1], [0])), C3, axes=([2], [0]))
+    z_v = np.tensordot(top, bottom, axes=([0, 1, 2], [2, 1, 0]))
+    kappa = z_site * z_corner / (z_h * z_v)
+    return Observables(
+        f=-np.log(abs(kappa)) / lt.beta,
+        m=np.sum(E * lt.impurities["m"]) / z_site,
+        E=np.sum(E * lt.impurities["E"]) / z_site,
+        xi=correlation_length(env, lt.a) if xi else np.nan,
+    )
+
+
+# ============================================================
+# Corner spectrum records
+# ============================================================
+#
+# The singular values s of the cut between Q_k and Q_{k+1} are those of the
+# product of the four corners, i.e. of the reduced density matrix of a
+# half-infinite row: p = s / sum(s) is the entanglement spectrum of the
+# corresponding 1D quantum state. `projectors` computes them every step, so
+# recording them costs one copy per iteration and no contraction.
+
+RECORD_MODES = ("all", "final")
+
+
+class SpectrumLog:
+    """
+    Leading singular values of the CTMRG cut, one row per recorded step, in
+    a float32 array of k columns (s / s_0, padded with NaN where fewer than k
+    were kept) that grows by doubling. Rows are labelled by `iteration` and
+    by the `chi` of the run, so one log can collect a scan over chi or
+    temperature. k=None takes the width of the first row; entropies are exact
+    only if no row was cut to k.
+    """
+
+    def __init__(self, k=None, capacity=64):
+        self.k = k
+        self.rows = 0
+        self._capacity = capacity
+        self._s = None
+        self._labels = np.zeros((capacity, 2), dtype=np.int32)
+
+    def append(self, s, iteration=0, chi=None):
+        """Record the spectrum `s` (any normalization, sorted descending)."""
+        s = np.asarray(s, dtype=np.float64)
+        if self._s is None:
+            self.k = len(s) if self.k is None else self.k
+            self._s = np.full((self._capacity, self.k), np.nan, dtype=np.float32)
+        if self.rows == len(self._s):
+            grown = np.full((2 * self.rows, self.k), np.nan, dtype=np.float32)
+            grown[:self.rows] = self._s
+            self._s = grown
+            self._labels = np.concatenate([self._labels, np.zeros_like(self._labels)])
+        n = min(len(s), self.k)
+        self._s[self.rows, :n] = s[:n] / s[0]
+        self._labels[self.rows] = iteration, len(s) if chi is None else chi
+        self.rows += 1
+
+    @property
+    def s(self):
+        """(rows, k) float32 spectra normalized to s_0 = 1."""
+        return self._s[:self.rows] if self._s is not None else np.zeros((0, self.k or 0), np.float32)
+
+    @property
+    def iteration(self):
+        return self._labels[:self.rows, 0]
+
+    @property
+    def chi(self):
+        return self._labels[:self.rows, 1]
+
+    @property
+    def nbytes(self):
+        return self.s.nbytes + self._labels[:self.rows].nbytes
+
+    def __len__(self):
+        return self.rows
+
+    def entropy(self, alpha=1.0):
+        return entanglement_entropy(self.s, alpha)
+
+    def gaps(self, n=1):
+        return spectral_gaps(self.s, n)
+
+    def save(self, path):
+        """Write the recorded rows to an .npz file."""
+        np.savez(path, s=self.s, iteration=self.iteration, chi=self.chi)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            log = cls(k=data["s"].shape[1], capacity=max(1, len(data["s"])))
+            log._s = data["s"].copy() if len(data["s"]) else None
+            log._labels = np.stack([data["iteration"], data["chi"]], axis=1).astype(np.int32)
+            log.rows = len(data["s"])
+        return log
+
+
+def _probabilities(s):
+    # p = s / sum(s) along the last axis, NaN padding counted as zero
+    s = np.nan_to_num(np.asarray(s, dtype=np.float64))
+    total = s.sum(axis=-1, keepdims=True)
+    return np.divide(s, total, out=np.zeros_like(s), where=total > 0)
+
+
+def entanglement_entropy(s, alpha=1.0):
+    """
+        entanglement_entropy(s, alpha=1.0) -> ndarray
+
+    Entropy of the spectra in the last axis of `s` (a `SpectrumLog.s`, a
+    `CTMRGResult.spectrum` or a stack of them), with p = s / sum(s):
+    -sum p ln p, or the Renyi entropy ln(sum p^alpha) / (1 - alpha).
+    """
+    p = _probabilities(s)
+    if alpha == 1:
+        logs = np.log(p, out=np.zeros_like(p), where=p > 0)
+        return -np.sum(p * logs, axis=-1)
+    return np.log(np.sum(p ** alpha, axis=-1)) / (1.0 - alpha)
+
+
+def spectral_gaps(s, n=1):
+    """
+        spectral_gaps(s, n=1) -> ndarray (..., n)
+
+    ln(s_0 / s_i) for i = 1 .. n along the last axis of `s`; inf where s_i
+    is missing or zero.
+    """
+    s = np.nan_to_num(np.asarray(s, dtype=np.float64))
+    if s.shape[-1] <= n:
+        s = np.concatenate([s, np.zeros(s.shape[:-1] + (n + 1 - s.shape[-1],))], axis=-1)
+    ratio = s[..., 1:n + 1] / s[..., :1]
+    with np.errstate(divide="ignore"):
+        return -np.log(ratio)
+
+
+def central_charge(S, xi=None, chi=None):
+    """
+        central_charge(S, xi=None, chi=None) -> (c, S_0)
+
+    Finite-chi estimate of the central charge from the entropies S of runs at
+    one critical point and several chi (last axis; leading axes are fitted
+    independently). With `xi`, the least-squares fit S = (c / 6) ln(xi) + S_0
+    of Calabrese and Cardy. Without it, from chi alone through the
+    finite-entanglement scaling xi ~ chi^kappa, kappa = 6 / (c (sqrt(12 / c) + 1)),
+    so that the slope b of S against ln(chi) gives c = 12 / (1 / b - 1)^2.
+    """
+    S = np.asarray(S, dtype=np.float64)
+    if xi is not None:
+        x = np.log(np.asarray(xi, dtype=np.float64))
+    elif chi is not None:
+        x = np.log(np.asarray(chi, dtype=np.float64))
+    else:
+        raise ValueError("central_charge needs xi or chi")
+    x = np.broadcast_to(x, S.shape)
+    dx = x - x.mean(axis=-1, keepdims=True)
+    slope = np.sum(dx * (S - S.mean(axis=-1, keepdims=True)), axis=-1) / np.sum(dx * dx, axis=-1)
+    S0 = S.mean(axis=-1) - slope * x.mean(axis=-1)
+    if xi is not None:
+        return 6.0 * slope, S0
+    with np.errstate(divide="ignore"):
+        return 12.0 / (1.0 / slope - 1.0) ** 2, S0
+
+
+# ============================================================
+# Driver
+# ============================================================
+
+@dataclass
+class CTMRGResult:
+    """
+    Converged environment, its observables and run statistics; `spectra` is
+    the `SpectrumLog` of the run if one was recorded.
+    """
+    env: Environment
+    observables: Observables
+    iterations: int
+    converged: bool
+    trunc_err: float
+    spectrum: np.ndarray
+    spectra: SpectrumLog = None
+
+
+def _spectrum_change(s_new, s_old):
+    n = max(len(s_new), len(s_old))
+    return np.linalg.norm(np.pad(s_new, (0, n - len(s_new)))
+                          - np.pad(s_old, (0, n - len(s_old))))
+
+
+ABSORB_MODES = ("dense", "factored", "sparse")
+PRECISIONS = ("double", "mixed")
+SINGLE_TOL = 1e-5
+SINGLE_STALL = 1e-4
+
+
+def _step_tensors(lt, absorb, dtype):
+    # the local tensor and factors `ctmrg_step` absorbs, in `dtype`
+    a = lt.a.astype(dtype)
+    if absorb == "sparse":
+        return SparseTensor.from_dense(a), None
+    if absorb == "factored":
+        w, F = lt.factors
+        return a, (w.astype(dtype), [f.astype(dtype) for f in F])
+    return a, None
+
+
+def _fit_budget(lt, chi, absorb, workspace, budget, dtype):
+    # absorb mode and workspace for steps in `dtype` under `budget` bytes: an
+    # OutOfCore of that dtype (returned again as scratch, to be closed) if the
+    # planned in-memory step does not fit
+    if budget is None or isinstance(workspace, OutOfCore):
+        return absorb, workspace, None
+    mode = "workspace" if workspace is not None else absorb.replace("sparse", "dense")
+    if plan_memory(chi, lt.d, mode, dtype).peak <= budget:
+        return absorb, workspace, None
+    scratch = OutOfCore(chi, lt.d, budget, dtype)
+    return absorb.replace("factored", "dense"), scratch, scratch
+
+
+def ctmrg(lt, chi, tol=1e-10, max_iter=1000, env=None, init=None,
+          backend="gesdd", xi=True, absorb="dense", recycler=None, workspace=None,
+          memory_budget=None, precision="double", patience=10, record=None, spectra=None):
+    """
+        ctmrg(lt, chi, tol=1e-10, max_iter=1000, env=None, init=None,
+              backend="gesdd", xi=True, absorb="dense", recycler=None,
+              workspace=None, memory_budget=None, precision="double",
+              patience=10, record=None, spectra=None) -> CTMRGResult
+
+    Iterate `ctmrg_step` from `env` (or from `initial_environment(lt, init)`)
+    until the singular values of the cut change by less than `tol`. init=None
+    is "fixed" for ferromagnetic spin models and "open" for antiferromagnets
+    (J < 0), whose ordered state does not match a uniform frozen boundary,
+    and for bond-variable tensors (w is None), whose frozen boundary is
+    itself a fixed point of the iteration. With
+    absorb="factored" the local tensor is absorbed through `lt.factors`, which
+    pays off for q-state models with large d; absorb="sparse" absorbs it as a
+    `SparseTensor`, for constrained models whose `a` is mostly zeros. Passing a `SubspaceRecycler`
+    switches the projectors to subspace recycling; its counters report how many
+    truncations needed a full SVD. `workspace` (a `Workspace`, or True for a
+    fresh one) runs every step in preallocated buffers. If `plan_memory`
+    predicts more than `memory_budget` bytes for the chosen path, the run
+    switches to `ctmrg_step_chunked` in a temporary `OutOfCore`, absorbing the
+    dense local tensor without recycling.
+
+    With precision="mixed" the iteration starts in float32 and promotes the
+    environment and the local tensor to float64 once the spectrum change
+    drops below SINGLE_TOL (or `tol`, if larger), or, once below
+    SINGLE_STALL, has not reached a new minimum for `patience` steps, i.e.
+    has stalled at single-precision noise; the run then converges in float64
+    as usual. A `Workspace` is created per precision, so pass workspace=True
+    rather than an instance; the memory budget is checked for each precision
+    in its own dtype, so the float32 phase may run in memory and the float64
+    phase out of core.
+
+    record="all" keeps the cut spectrum of every iteration, record="final"
+    only the converged one, in `spectra` (a new `SpectrumLog` of width chi if
+    None, or an existing log to append to, by default the final spectrum)
+    returned as `result.spectra`.
+    """
+    if absorb not in ABSORB_MODES:
+        raise ValueError(f"unknown absorb mode {absorb!r}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision {precision!r}; expected one of {PRECISIONS}")
+    if record is not None and record not in RECORD_MODES:
+        raise ValueError(f"unknown record mode {record!r}; expected one of {RECORD_MODES}")
+    if spectra is not None and record is None:
+        record = "final"
+    if record is not None and spectra is None:
+        spectra = SpectrumLog(k=chi)
+    single = precision == "mixed"
+    if single and workspace not in (None, True):
+        raise ValueError("mixed precision creates its own workspaces; pass workspace=True")
+    dtype = np.float32 if single else np.float64
+    requested = (absorb, workspace, recycler)
+    if workspace is True:
+        workspace = Workspace(chi, lt.d, dtype)
+    absorb, workspace, scratch = _fit_budget(lt, chi, absorb, workspace, memory_budget, dtype)
+    recycler = None if scratch is not None else recycler
+    a, factors = _step_tensors(lt, absorb, dtype)
+    if init is None:
+        antiferro = lt.model is not None and lt.model.J < 0
+        init = "open" if lt.w is None or antiferro else "fixed"
+    env = initial_environment(lt, init) if env is None else env
+    env = env.astype(dtype)
+    s_old = np.zeros(1)
+    err, converged, it = 0.0, False, 0
+    best, since_best = np.inf, 0
+    for it in range(1, max_iter + 1):
+        env, cuts, err = ctmrg_step(env, a, chi, backend, factors, recycler, workspace)
+        s_new = cuts[0]
+        if record == "all":
+            spectra.append(s_new, it, chi)
+        change = _spectrum_change(s_new, s_old)
+        s_old = s_new
+        if single:
+            best, since_best = (change, 0) if change < best else (best, since_best + 1)
+            if change < max(tol, SINGLE_TOL) or (best < SINGLE_STALL and since_best >= patience):
+                single = False
+                env = env.astype(np.float64)
+                # plan the float64 phase afresh: it may not fit where float32 did
+                if scratch is not None:
+                    scratch.close()
+                absorb, workspace, recycler = requested
+                workspace = Workspace(chi, lt.d) if workspace is True else None
+                absorb, workspace, scratch = _fit_budget(lt, chi, absorb, workspace,
+                                                         memory_budget, np.float64)
+                recycler = None if scratch is not None else recycler
+                a, factors = _step_tensors(lt, absorb, np.float64)
+            continue
+        if change < tol:
+            converged = True
+            break
+    if scratch is not None:
+        scratch.close()
+    if record == "final":
+        spectra.append(s_new, it, chi)
+    if workspace is not None or env.block.dtype != np.float64:
+        env = env.astype(np.float64)
+    return CTMRGResult(env=env, observables=observables(env, lt, xi=xi),
+                       iterations=it, converged=converged, trunc_err=err,
+                       spectrum=s_new, spectra=spectra if record is not None else None)
+
+
+def run(model, beta, chi, **kwargs):
+    """Shorthand for ctmrg(local_tensors(model, beta), chi, **kwargs)."""
+    return ctmrg(local_tensors(model, beta), chi, **kwargs)
+
+
+# ============================================================
+# Finite-lattice CTM by corner doubling
+# ============================================================
+#
+# Nishino's finite-lattice CTM: a corner of n x n sites is doubled to 2n x 2n
+# by gluing it to two edge blocks and one bulk block of the same size,
+#
+#        [ T_top  C ]              [ A  T ]              [ A  A ]
+#   C' = [ A      T ]         T' = [ A  T ]         A' = [ A  A ]
+#
+# and every pair of merged legs is truncated back to chi with one isometry U
+# taken from the spectrum of the new corner. All blocks are written in the
+# frame of the upper-right quadrant: C[l, d], T[u, l, d] (the right edge) and
+# A[r, d, l, u]; a merged leg lists the sub-leg farther from the centre of the
+# lattice first. Four corners C_n meet at the centre of a 2n x 2n lattice.
+
+@dataclass
+class FiniteSizeResult:
+    """Observables of the L x L lattice built from four corners of size L/2."""
+    L: int
+    f: float
+    m: float
+    E: float
+    trunc_err: float
+
+
+def _merge_bulk(TL, TR, BL, BR, U):
+    # merge the two columns first, inserting U U^T on the bonds between them
+    # (as in HOTRG), so no intermediate exceeds chi^5 entries
+    left = np.tensordot(TL, U, axes=([2], [0]))                   # [a, b, d, j, M]
+    left = np.tensordot(left, BL, axes=([1, 3], [3, 2]))          # [a, d, M, h, i]
+    left = np.tensordot(left, U, axes=([0, 3], [0, 1]))           # [d, M, i, X]
+    right = np.tensordot(TR, U, axes=([0], [0]))                  # [f, a, g, k, R]
+    right = np.tensordot(right, BR, axes=([0, 3], [3, 0]))        # [a, g, R, l, h]
+    right = np.tensordot(right, U, axes=([0, 4], [0, 1]))         # [g, R, l, X]
+    x = np.tensordot(left, U, axes=([0], [1]))                    # [M, i, X, g, N]
+    x = np.tensordot(x, right, axes=([2, 3], [3, 0]))             # [M, i, N, R, l]
+    x = np.tensordot(x, U, axes=([4, 1], [0, 1]))                 # [M, N, R, D]
+    return x.transpose(2, 3, 0, 1)
+
+
+def _merge_edge(A_up, T_up, A_lo, T_lo, U):
+    left = np.tensordot(A_up, U, axes=([2], [0]))                 # [a, b, d, i, M]
+    left = np.tensordot(left, A_lo, axes=([1, 3], [3, 2]))        # [a, d, M, g, h]
+    right = np.tensordot(T_up, T_lo, axes=([2], [0]))             # [e, a, g, j]
+    x = np.tensordot(left, right, axes=([0, 3], [1, 2]))          # [d, M, h, e, j]
+    x = np.tensordot(x, U, axes=([3, 0], [0, 1]))                 # [M, h, j, N]
+    x = np.tensordot(x, U, axes=([2, 1], [0, 1]))                 # [M, N, D]
+    return x.transpose(1, 0, 2)
+
+
+def _merge_corner(T, C, A):
+    # T_top[l, d, r] = T[r, d, l] is the right edge reflected onto the top edge
+    x = np.tensordot(T, C, axes=([0], [0]))                       # [e, s, q]
+    x = np.tensordot(x, T, axes=([2], [0]))                       # [e, s, f, t]
+    x = np.tensordot(x, A, axes=([0, 2], [3, 0]))                 # [s, t, g, a]
+    n = x.shape[0] * x.shape[3]
+    return x.transpose(0, 3, 1, 2).reshape(n, n)
+
+
+def finite_ctm(lt, chi, steps, boundary="open"):
+    """
+        finite_ctm(lt, chi, steps, boundary="open") -> list[FiniteSizeResult]
+
+    Lattices of linear size L = 2, 4, ..., 2^(steps+1) with `boundary` ("open" or
+    "fixed", see `LocalTensors.boundary`) from `steps` corner doublings, i.e.
+    logarithmically many steps in L. m and E are measured on a site next to the
+    centre. Requires a tensor with the full symmetry of the square lattice.
+    """
+    a = lt.a
+    if not is_symmetric(a):
+        raise ValueError("finite_ctm needs a local tensor symmetric under rotations and reflections")
+    cap = lt.boundary(boundary)[0]
+    imps = dict(lt.impurities)
+
+    def corner(x):
+        return np.einsum('rdlu,r,u->ld', x, cap, cap)
+
+    A = a
+    T = np.einsum('rdlu,r->uld', a, cap)
+    C = corner(a)
+    A_imp = dict(imps)
+    C_imp = {name: corner(b) for name, b in imps.items()}
+    log_a = log_t = log_c = 0.0
+    err = 0.0
+    results = []
+    for step in range(steps + 1):
+        n = 2 ** step
+        C3 = C @ C @ C
+        z = np.trace(C3 @ C)
+        log_z = 4 * log_c + np.log(abs(z))
+        results.append(FiniteSizeResult(
+            L=2 * n,
+            f=-log_z / (lt.beta * (2 * n) ** 2),
+            m=np.trace(C_imp["m"] @ C3) / z,
+            E=np.trace(C_imp["E"] @ C3) / z,
+            trunc_err=err))
+        if step == steps:
+            break
+
+        # isometry from the untruncated new corner, which is symmetric
+        C_full = _merge_corner(T, C, A)
+        C_full = 0.5 * (C_full + C_full.T)
+        lam, V = np.linalg.eigh(C_full)
+        order = np.argsort(-np.abs(lam))
+        k = min(chi, len(lam))
+        err = max(err, np.sum(np.abs(lam[order[k:]])) / np.sum(np.abs(lam)))
+        U = V[:, order[:k]].reshape(C.shape[0], A.shape[0], k)
+
+        C_new = U.reshape(-1, k).T @ C_full @ U.reshape(-1, k)
+        T_new = _merge_edge(A, T, A, T, U)
+        A_new = _merge_bulk(A, A, A, A, U)
+        for name in imps:
+            Ci = _merge_corner(T, C, A_imp[name])
+            C_imp[name] = U.reshape(-1, k).T @ Ci @ U.reshape(-1, k)
+            A_imp[name] = _merge_bulk(A, A, A_imp[name], A, U)
+
+        # every block carries its own log normalization
+        nc, nt, na = np.abs(C_new).max(), np.abs(T_new).max(), np.abs(A_new).max()
+        log_c, log_t, log_a = (log_c + 2 * log_t + log_a + np.log(nc),
+                               2 * log_a + 2 * log_t + np.log(nt),
+                               4 * log_a + np.log(na))
+        C, T, A = C_new / nc, T_new / nt, A_new / na
+        for name in imps:
+            C_imp[name] /= nc
+            A_imp[name] /= na
+    return results
@@ -0,0 +1,181 @@
+"""
+Locating the critical temperature with warm-started CTMRG runs.
+
+A T_c search runs in two stages:
+
+    bracket:  a coarse scan of beta at the smallest chi finds an interval that
+              contains the transition;
+    refine:   the interval is narrowed by bisection (criterion "m") or golden
+              section search (criteria "xi" and "gap"), raising chi every time
+              the bracket has shrunk by a factor `chi_step`.
+
+Criteria:
+
+    "m"    beta is in the ordered phase if |m| > m_tol; bisection on the phase.
+    "xi"   the correlation length of the CTMRG environment peaks at T_c.
+    "gap"  the corner spectrum gap ln(s_0 / s_1) is smallest at T_c.
+
+Every run starts from the converged environment of the nearest beta evaluated so
+far, so a probe costs a few dozen CTMRG iterations instead of a full run. Only
+environments from the ordered side are reused (or the "fixed" initial one): a
+symmetry-broken environment relaxes to the symmetric one above T_c, but a
+symmetric one stays symmetric below T_c, where its degenerate spectra would
+make xi diverge and close the gap.
+
+At finite chi CTMRG orders slightly above T_c, so a bracket found at small chi
+can lie entirely on the high-temperature side of the true transition. Whenever
+chi is raised the ends of the bracket are probed again and the bracket is
+moved if either of them has changed phase.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .core import ctmrg, local_tensors, spectral_gaps
+
+CRITERIA = ("m", "xi", "gap")
+_GOLDEN = 0.5 * (np.sqrt(5.0) - 1.0)
+
+
+@dataclass
+class Probe:
+    """One CTMRG run of the search."""
+    beta: float
+    chi: int
+    value: float
+    ordered: bool
+    iterations: int
+
+
+@dataclass
+class TcResult:
+    """Estimate of beta_c = 1 / T_c, the final bracket and every probe that led to it."""
+    beta_c: float
+    T_c: float
+    bracket: tuple
+    chi: int
+    probes: list = field(default_factory=list)
+
+    @property
+    def iterations(self):
+        """Total number of CTMRG iterations spent in the search."""
+        return sum(p.iterations for p in self.probes)
+
+
+class _Prober:
+    # runs CTMRG at (beta, chi) with the nearest reusable environment as warm start
+    def __init__(self, model, criterion, m_tol, tol, max_iter, backend):
+        self.model, self.criterion, self.m_tol = model, criterion, m_tol
+        self.tol, self.max_iter, self.backend = tol, max_iter, backend
+        self.envs = {}
+        self.probes = []
+
+    def warm_start(self, beta):
+        usable = [b for b, (env, ordered) in self.envs.items() if ordered]
+        if not usable:
+            return None
+        return self.envs[min(usable, key=lambda b: abs(b - beta))][0]
+
+    def __call__(self, beta, chi):
+        lt = local_tensors(self.model, beta)
+        res = ctmrg(lt, chi, tol=self.tol, max_iter=self.max_iter, env=self.warm_start(beta),
+                    backend=self.backend, xi=self.criterion == "xi")
+        obs = res.observables
+        ordered = bool(abs(obs.m) > self.m_tol)
+        if self.criterion == "m":
+            value = abs(obs.m)
+        elif self.criterion == "xi":
+            value = -obs.xi
+        else:
+            value = float(spectral_gaps(res.spectrum)[0])
+        self.envs[beta] = (res.env, ordered)
+        self.probes.append(Probe(beta=beta, chi=chi, value=value, ordered=ordered,
+                                 iterations=res.iterations))
+        return value, ordered
+
+
+def bracket(prober, betas, chi):
+    """
+        bracket(prober, betas, chi) -> (beta_lo, beta_hi)
+
+    Coarse scan over the increasing grid `betas`. For "m" the bracket is the first
+    disordered/ordered pair; for "xi" and "gap" it is the two neighbours of the
+    grid point with the smallest objective (the peak of xi or dip of the gap).
+    """
+    betas = np.sort(np.asarray(betas, dtype=float))
+    values, ordered = zip(*(prober(b, chi) for b in betas))
+    if prober.criterion == "m":
+        hits = np.flatnonzero(ordered)
+        if len(hits) == 0 or hits[0] == 0:
+            raise ValueError("no disordered/ordered pair in the scan; widen the beta range")
+        i = hits[0]
+        return betas[i - 1], betas[i]
+    i = int(np.argmin(values))
+    return betas[max(i - 1, 0)], betas[min(i + 1, len(betas) - 1)]
+
+
+def _recheck(prober, lo, hi, chi, beta_min, beta_max):
+    # probe the ends of a phase bracket at a new chi and walk it back onto the transition
+    width = hi - lo
+    while hi < beta_max and not prober(hi, chi)[1]:
+        lo, hi = hi, min(hi + width, beta_max)
+    while lo > beta_min and prober(lo, chi)[1]:
+        lo, hi = max(lo - width, beta_min), lo
+    return lo, hi
+
+
+def find_tc(model, beta_min, beta_max, criterion="m", n_probe=8, chi_min=8, chi_max=32,
+            chi_step=8.0, beta_tol=1e-5, m_tol=0.1, tol=1e-9, max_iter=500,
+            backend="gesdd"):
+    """
+        find_tc(model, beta_min, beta_max, criterion="m", n_probe=8, chi_min=8,
+                chi_max=32, chi_step=8.0, beta_tol=1e-5, m_tol=0.1, tol=1e-9,
+                max_iter=500, backend="gesdd") -> TcResult
+
+    Bracket the transition of `model` with `n_probe` evenly spaced betas in
+    [beta_min, beta_max] at chi_min, then refine until the bracket is narrower
+    than `beta_tol`. chi doubles (up to chi_max) each time the bracket shrinks
+    by `chi_step`; `tol` and `max_iter` are passed to every CTMRG run.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"unknown criterion {criterion!r}; expected one of {CRITERIA}")
+    prober = _Prober(model, criterion, m_tol, tol, max_iter, backend)
+    lo, hi = bracket(prober, np.linspace(beta_min, beta_max, n_probe), chi_min)
+    width0, chi = hi - lo, chi_min
+
+    def chi_for(width):
+        level = int(np.log(width0 / width) / np.log(chi_step)) if width > 0 else 0
+        return min(chi_max, chi_min * 2 ** level)
+
+    if criterion == "m":
+        while hi - lo > beta_tol:
+            new_chi = chi_for(hi - lo)
+            if new_chi != chi:
+                chi = new_chi
+                lo, hi = _recheck(prober, lo, hi, chi, beta_min, beta_max)
+            mid = 0.5 * (lo + hi)
+            _, ordered = prober(mid, chi)
+            lo, hi = (lo, mid) if ordered else (mid, hi)
+    else:
+        x1, x2 = hi - _GOLDEN * (hi - lo), lo + _GOLDEN * (hi - lo)
+        f1, _ = prober(x1, chi)
+        f2, _ = prober(x2, chi)
+        while hi - lo > beta_tol:
+            new_chi = chi_for(hi - lo)
+            if new_chi != chi:
+                # the objective depends on chi: compare both points at the new one
+                chi = new_chi
+                f1, _ = prober(x1, chi)
+                f2, _ = prober(x2, chi)
+            if f1 < f2:
+                hi, x2, f2 = x2, x1, f1
+                x1 = hi - _GOLDEN * (hi - lo)
+                f1, _ = prober(x1, chi)
+            else:
+                lo, x1, f1 = x1, x2, f2
+                x2 = lo + _GOLDEN * (hi - lo)
+                f2, _ = prober(x2, chi)
+    beta_c = 0.5 * (lo + hi)
+    return TcResult(beta_c=beta_c, T_c=1.0 / beta_c, bracket=(lo, hi), chi=chi,
+                    probes=prober.probes)
@@ -0,0 +1,349 @@
+"""
+Ground states of 2D quantum lattice models as iPEPS, by imaginary-time simple
+update, measured with CTMRG (Tutorial section 8).
+
+The state is a checkerboard iPEPS: tensors A and B, A[p, r, d, l, u] with
+the physical index first and the virtual legs in the order of the core
+module, and four bond weights on the bonds of A,
+
+    lam[0]: A.r - B.l     lam[1]: A.d - B.u     lam[2]: A.l - B.r     lam[3]: A.u - B.d
+
+`simple_update` applies the Trotter gates exp(-tau h) bond by bond. The rest
+of the lattice enters only through the weights of the other legs (the
+"mean-field" environment of the simple update), which makes each bond update
+a QR-reduced SVD of size (d D, d D). The time step is lowered through `taus`,
+and each value is held until the weights stop changing.
+
+The measurement contracts the double-layer network <psi|psi> of the weighted
+tensors (sqrt(lam) on each end of a bond) with a two-sublattice CTMRG. It
+keeps one environment per sublattice, and `checkerboard_step` is the
+simultaneous move of `core.ctmrg_step` in which each enlarged corner and
+each absorbed column comes from the sublattice that sits there. Bond
+energies are read off two columns, one from each environment.
+
+`hardcore_bosons` gives the 2D version of the model of scripts/ExactDiag.jl,
+
+    H = t sum_<ij> (b+_i b_j + h.c.) + Delta sum_<ij> (n_i - 1/2)(n_j - 1/2) - mu sum_i n_i,
+
+which at t = 1/2, Delta = 1 is the Heisenberg antiferromagnet
+(E / N = -0.6694 from quantum Monte Carlo).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import scipy.linalg
+
+from .core import (Environment, _normalize, _spectrum_change, absorb_edge, column_boundaries,
+                   column_transfer, enlarged_corner, ncon, projectors, rotate)
+
+
+# ============================================================
+# Hamiltonians
+# ============================================================
+
+def hardcore_bosons(t=0.5, Delta=1.0, mu=0.0, z=4):
+    """
+        hardcore_bosons(t=0.5, Delta=1.0, mu=0.0, z=4) -> (h, ops)
+
+    Bond Hamiltonian h[p1, p2, p1', p2'] of a lattice with z bonds per site
+    (4 for the square lattice, 2 for the chain), with the chemical potential
+    shared among the bonds of a site, and the single-site operators
+    {"n", "b", "bdag"} in the occupation basis |0>, |1>.
+    """
+    b = np.array([[0.0, 1.0], [0.0, 0.0]])
+    n = np.diag([0.0, 1.0])
+    one = np.eye(2)
+    c = n - 0.5 * one
+    h = (t * (np.kron(b.T, b) + np.kron(b, b.T)) + Delta * np.kron(c, c)
+         - mu / z * (np.kron(n, one) + np.kron(one, n)))
+    return h.reshape(2, 2, 2, 2), {"n": n, "b": b, "bdag": b.T}
+
+
+# ============================================================
+# Simple update
+# ============================================================
+
+@dataclass
+class PEPS:
+    """Checkerboard iPEPS: site tensors A, B [p, r, d, l, u] and the bond weights lam[0..3]."""
+    A: np.ndarray
+    B: np.ndarray
+    lam: list
+
+    @property
+    def D(self):
+        return self.A.shape[1]
+
+    def weighted(self):
+        """A and B with sqrt(lam) absorbed on every leg."""
+        roots = [np.sqrt(l) for l in self.lam]
+        A = _scale_legs(self.A, roots)
+        B = _scale_legs(self.B, [roots[(k + 2) % 4] for k in range(4)])
+        return A, B
+
+
+def _scale_legs(A, w):
+    # A[p, r, d, l, u] times w[k] on virtual leg k
+    return (A * w[0][None, :, None, None, None] * w[1][None, None, :, None, None]
+            * w[2][None, None, None, :, None] * w[3][None, None, None, None, :])
+
+
+def _rot(A, k):
+    # virtual leg k of A becomes leg 0 (the physical leg stays first)
+    return A.transpose(0, *[1 + (k + j) % 4 for j in range(4)])
+
+
+def _unrot(A, k):
+    return A.transpose(0, *[1 + (j - k) % 4 for j in range(4)])
+
+
+def random_peps(d, D, rng=None):
+    """Random checkerboard iPEPS of physical dimension d and bond dimension D, unit weights."""
+    rng = np.random.default_rng(rng)
+    shape = (d, D, D, D, D)
+    return PEPS(rng.standard_normal(shape), rng.standard_normal(shape), [np.ones(D) for _ in range(4)])
+
+
+def bond_update(peps, k, gate, D):
+    """
+        bond_update(peps, k, gate, D) -> PEPS
+
+    Apply gate[p1, p2, p1', p2'] to bond k (see the module docstring; p1 is
+    the physical index of A) and truncate the bond back to D by the simple
+    update. Only the three other weights of each tensor enter as environment.
+    """
+    lam = peps.lam
+    a, b = _rot(peps.A, k), _rot(peps.B, k)                  # bond on a.r and b.l
+    la = [lam[(k + j) % 4] for j in range(4)]
+    lb = [lam[(k + 2 + j) % 4] for j in range(4)]
+    ones = np.ones(len(lam[k]))
+    a = _scale_legs(a, [ones, la[1], la[2], la[3]])
+    b = _scale_legs(b, [lb[0], lb[1], ones, lb[3]])
+    dp, Da = a.shape[0], a.shape[1]
+    # reduce each side to the part touching the bond: a = Qa Ra, b = Qb Rb
+    Qa, Ra = np.linalg.qr(a.transpose(2, 3, 4, 0, 1).reshape(-1, dp * Da))
+    Qb, Rb = np.linalg.qr(b.transpose(1, 2, 4, 0, 3).reshape(-1, dp * Da))
+    Ra = Ra.reshape(-1, dp, Da)
+    Rb = Rb.reshape(-1, dp, Da)
+    theta = np.einsum('mpx,x,nqx->mpnq', Ra, lam[k], Rb)
+    theta = np.einsum('pqst,msnt->mpnq', gate, theta)
+    m, n = theta.shape[0], theta.shape[2]
+    U, s, Vh = scipy.linalg.svd(theta.reshape(m * dp, n * dp), full_matrices=False,
+                                lapack_driver="gesdd")
+    keep = min(D, len(s))
+    s = s[:keep] / np.linalg.norm(s[:keep])
+    Ra = U[:, :keep].reshape(m, dp * keep)
+    Rb = Vh[:keep].reshape(keep, n, dp).transpose(1, 2, 0).reshape(n, dp * keep)
+    shape_a = (a.shape[2], a.shape[3], a.shape[4], dp, keep)
+    shape_b = (b.shape[1], b.shape[2], b.shape[4], dp, keep)
+    a = (Qa @ Ra).reshape(shape_a).transpose(3, 4, 0, 1, 2)      # [p, r, d, l, u]
+    b = (Qb @ Rb).reshape(shape_b).transpose(3, 0, 1, 4, 2)
+    inv = [1.0 / np.maximum(w, 1e-12) for w in (la, lb)]
+    a = _scale_legs(a, [np.ones(keep), inv[0][1], inv[0][2], inv[0][3]])
+    b = _scale_legs(b, [inv[1][0], inv[1][1], np.ones(keep), inv[1][3]])
+    new = list(lam)
+    new[k] = s
+    return PEPS(_normalize(_unrot(a, k)), _normalize(_unrot(b, k)), new)
+
+
+def simple_update(h, D, taus=(0.1, 0.03, 0.01, 0.003, 0.001), tol=1e-8, max_steps=2000,
+                  peps=None, rng=None):
+    """
+        simple_update(h, D, taus=(0.1, 0.03, 0.01, 0.003, 0.001), tol=1e-8,
+                      max_steps=2000, peps=None, rng=None) -> (PEPS, steps)
+
+    Imaginary-time evolution with the bond Hamiltonian h[p1, p2, p1', p2']
+    (p1 the left or upper site) from `peps` or a random state. A step applies
+    exp(-tau h) to the bonds 0, 1, 2, 3 and back (second-order Trotter); each
+    tau is kept until the weights change by less than `tol` in a step.
+    """
+    dp = h.shape[0]
+    H = h.reshape(dp * dp, dp * dp)
+    swap = h.transpose(1, 0, 3, 2).reshape(dp * dp, dp * dp)
+    peps = random_peps(dp, D, rng) if peps is None else peps
+    steps = 0
+    for tau in taus:
+        # on bonds 2 and 3 B is the left or upper site
+        half = [scipy.linalg.expm(-tau / 2 * X).reshape(dp, dp, dp, dp) for X in (H, swap)]
+        gates = [half[0], half[0], half[1], half[1]]
+        for _ in range(max_steps):
+            old = [l.copy() for l in peps.lam]
+            for k in (0, 1, 2, 3, 3, 2, 1, 0):
+                peps = bond_update(peps, k, gates[k], D)
+            steps += 1
+            change = max(np.abs(l - o).max() if l.shape == o.shape else np.inf
+                         for l, o in zip(peps.lam, old))
+            if change < tol:
+                break
+    return peps, steps
+
+
+# ============================================================
+# Double layer and checkerboard CTMRG
+# ============================================================
+
+def double_layer(A, O=None):
+    """
+        double_layer(A, O=None) -> ndarray (D^2, D^2, D^2, D^2)
+
+    sum_pq A[p, ...] O[p, q] A[q, ...] with the ket and bra legs fused, legs
+    [r, d, l, u] as for a classical local tensor; O defaults to the identity.
+    """
+    legs = [[-1, -3, -5, -7], [-2, -4, -6, -8]]
+    if O is None:
+        x = ncon([A, A], [[1] + legs[0], [1] + legs[1]])
+    else:
+        x = ncon([O, A, A], [[1, 2], [2] + legs[0], [1] + legs[1]])
+    return x.reshape([n * n for n in A.shape[1:]])
+
+
+def _open_environment(a_s, a_o):
+    # C_i from a_s with its outward legs traced (bra = ket), T_i from a_o
+    caps = [np.eye(int(round(np.sqrt(n)))).reshape(-1) for n in a_s.shape]
+    C, T = [], []
+    for i in range(4):
+        Ti = np.tensordot(rotate(a_o, i), caps[i], axes=([0], [0]))
+        T.append(Ti.transpose(2, 1, 0))
+        Ci = np.tensordot(rotate(a_s, i - 1), caps[(i - 1) % 4], axes=([0], [0]))
+        C.append(np.tensordot(Ci, caps[i], axes=([0], [0])).T)
+    return Environment(C, T)
+
+
+def checkerboard_step(envs, a, chi, backend="gesdd"):
+    """
+        checkerboard_step(envs, a, chi, backend="gesdd") -> (envs, spectra, trunc_err)
+
+    One simultaneous CTMRG move for the checkerboard of a[0] and a[1], where
+    envs[s] surrounds a site of sublattice s. The 2x2 cluster with sublattice
+    p in its upper-left corner gives the projectors of plaquette p; the new
+    C_i[s] is the corner of the plaquette whose Q_i lies on s, and the new
+    T_k[s] absorbs a[1 - s] between the cuts of the two plaquettes that meet
+    C_k[s] and C_{k+1}[s].
+    """
+    Q = [[enlarged_corner(envs[s], a[s], i) for i in range(4)] for s in (0, 1)]
+    P, Pt, spectra, err = {}, {}, [], 0.0
+    for p in (0, 1):
+        o = 1 - p
+        cluster = [Q[o][0], Q[p][1], Q[o][2], Q[p][3]]
+        for k in range(4):
+            P[p, k], Pt[p, k], s, e = projectors(cluster, k, chi, backend)
+            spectra.append(s)
+            err = max(err, e)
+    new = []
+    for s in (0, 1):
+        C, T = [], []
+        for i in range(4):
+            p = s if i % 2 else 1 - s
+            C.append(_normalize(Pt[p, (i - 1) % 4] @ Q[s][i] @ P[p, i]))
+        for k in range(4):
+            p = s if k % 2 else 1 - s
+            Tk = absorb_edge(envs[1 - s].T[k], a[1 - s], k)
+            Tk = np.tensordot(Pt[p, k], Tk, axes=([1], [0]))
+            Tk = np.tensordot(Tk, P[1 - p, k], axes=([2], [0]))
+            T.append(_normalize(Tk))
+        new.append(Environment(C, T))
+    return new, spectra, err
+
+
+def checkerboard_ctmrg(a, chi, tol=1e-10, max_iter=500, backend="gesdd"):
+    """
+        checkerboard_ctmrg(a, chi, tol=1e-10, max_iter=500, backend="gesdd")
+            -> (envs, iterations, converged, trunc_err)
+
+    Iterate `checkerboard_step` from the traced single-site environments
+    until the singular values of all cuts change by less than `tol`.
+    """
+    envs = [_open_environment(a[s], a[1 - s]) for s in (0, 1)]
+    old, err, converged, it = None, 0.0, False, 0
+    for it in range(1, max_iter + 1):
+        envs, spectra, err = checkerboard_step(envs, a, chi, backend)
+        if old is not None and max(_spectrum_change(s, t) for s, t in zip(spectra, old)) < tol:
+            converged = True
+            break
+        old = spectra
+    return envs, it, converged, err
+
+
+def _pair(envs, x, k):
+    # unnormalized <x[0] x[1]> on bond k, x in sublattice order; the pair is
+    # put in left/upper order and vertical bonds are turned so that down is right
+    s = (0, 1) if k in (0, 1) else (1, 0)
+    env = [envs[i] for i in s]
+    x = [x[i] for i in s]
+    if k % 2:
+        env = [Environment(e.C[1:] + e.C[:1], e.T[1:] + e.T[:1]) for e in env]
+        x = [rotate(t, 1) for t in x]
+    left, _ = column_boundaries(env[0])
+    _, right = column_boundaries(env[1])
+    v = column_transfer(env[0], x[0])(left)
+    return np.dot(column_transfer(env[1], x[1])(v), right)
+
+
+# ============================================================
+# Driver
+# ============================================================
+
+@dataclass
+class IPEPSResult:
+    """
+    Energy per site, the energies of the four bonds of A, the expectation
+    values of the single-site operators on both sublattices, and the state,
+    environments and run statistics.
+    """
+    energy: float
+    bonds: np.ndarray
+    local: dict
+    peps: PEPS
+    envs: list
+    steps: int
+    iterations: int
+    converged: bool
+    trunc_err: float
+
+
+def measure(peps, h, chi, ops=None, **kwargs):
+    """
+        measure(peps, h, chi, ops=None, **kwargs) -> IPEPSResult
+
+    Contract the double layer of `peps` with `checkerboard_ctmrg` (kwargs go
+    there) and evaluate h on the four bonds and every operator of `ops` on
+    both sublattices. h is split into sum_k L_k (x) R_k, so a bond costs one
+    column pair per term.
+    """
+    dp = h.shape[0]
+    A, B = peps.weighted()
+    a = [double_layer(A), double_layer(B)]
+    envs, iterations, converged, err = checkerboard_ctmrg(a, chi, **kwargs)
+    U, s, Vh = np.linalg.svd(h.transpose(0, 2, 1, 3).reshape(dp * dp, dp * dp))
+    terms = [((U[:, j] * s[j]).reshape(dp, dp), Vh[j].reshape(dp, dp))
+             for j in range(len(s)) if s[j] > 1e-14 * s[0]]
+    bonds = np.zeros(4)
+    for k in range(4):
+        norm = _pair(envs, a, k)
+        for L, R in terms:
+            # L acts on the left or upper site: A on bonds 0, 1 and B on bonds 2, 3
+            ops_ab = (L, R) if k in (0, 1) else (R, L)
+            bonds[k] += _pair(envs, [double_layer(A, ops_ab[0]), double_layer(B, ops_ab[1])], k) / norm
+    local = {}
+    for name, O in (ops or {}).items():
+        local[name] = np.array([
+            _pair(envs, [double_layer(A, O), a[1]], 0) / _pair(envs, a, 0),
+            _pair(envs, [a[0], double_layer(B, O)], 0) / _pair(envs, a, 0)])
+    return IPEPSResult(energy=bonds.sum() / 2, bonds=bonds, local=local, peps=peps, envs=envs,
+                       steps=0, iterations=iterations, converged=converged, trunc_err=err)
+
+
+def ipeps(h, D, chi, ops=None, taus=(0.1, 0.03, 0.01, 0.003, 0.001), peps=None, rng=None,
+          **kwargs):
+    """
+        ipeps(h, D, chi, ops=None, taus=(0.1, 0.03, 0.01, 0.003, 0.001),
+              peps=None, rng=None, **kwargs) -> IPEPSResult
+
+    `simple_update` to bond dimension D followed by one CTMRG `measure` at
+    environment dimension chi.
+    """
+    peps, steps = simple_update(h, D, taus=taus, peps=peps, rng=rng)
+    res = measure(peps, h, chi, ops, **kwargs)
+    res.steps = steps
+    return res
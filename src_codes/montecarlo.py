@@ -0,0 +1,227 @@
+"""
+Monte Carlo sampling of the q-state spin models, as an independent check of
+the tensor network engines.
+
+The sampler takes the same `Model` as `local_tensors` and only uses its
+energy tables (`bond_energy`, `site_energy`), so Ising, Potts and clock
+models, ferro- or antiferromagnetic and in a field, need no code of their
+own. Spins are integer states on an L x L torus, and `chains` independent
+Markov chains are stored as one array (chains, L*L) and updated together:
+
+    local    a checkerboard sweep: all sites of one sublattice have their
+             neighbours on the other, so each half sweep updates N/2 sites of
+             every chain at once with heat-bath or Metropolis moves;
+    Wolff    single-cluster flips for critical slowing down. The cluster is
+             grown as a breadth-first front over all chains at once. A flip
+             applies a reflection R_k(s) = (k - s) mod q of the states (a
+             global spin flip for Ising, a reflection of the angles for
+             clock), and a bond joins the cluster with probability
+             1 - exp(min(0, beta (e(s, s') - e(R s, s')))); this needs
+             e(R s, R s') = e(s, s') and no field.
+
+Measurements per sweep are the energy per site E and the order parameter
+|m| (|sum exp(i theta)| / N for Ising and clock, (q max_s n_s - 1) / (q - 1)
+for Potts, the finite-size counterparts of the fixed-boundary m of CTMRG).
+Error bars come from a logarithmic binning analysis over the sweeps of all
+chains (`binned_error`).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+LOCAL_UPDATES = ("heatbath", "metropolis")
+
+
+def _neighbours(L):
+    # (4, N) flat indices of the right, down, left and up neighbour on the torus
+    i, j = np.divmod(np.arange(L * L), L)
+    return np.stack([i * L + (j + 1) % L, (i + 1) % L * L + j,
+                     i * L + (j - 1) % L, (i - 1) % L * L + j])
+
+
+def _sublattices(L):
+    i, j = np.divmod(np.arange(L * L), L)
+    return [np.flatnonzero((i + j) % 2 == p) for p in (0, 1)]
+
+
+def energy(model, spins, L):
+    """Energy per site of every chain in `spins` (chains, L*L)."""
+    nb = _neighbours(L)
+    e_bond = model.bond_energy()
+    e = e_bond[spins, spins[:, nb[0]]] + e_bond[spins, spins[:, nb[1]]] + model.site_energy()[spins]
+    return e.mean(axis=1)
+
+
+def magnetization(model, spins):
+    """Order parameter |m| of every chain in `spins` (chains, N), see the module docstring."""
+    if model.name == "potts":
+        counts = np.stack([(spins == s).mean(axis=1) for s in range(model.q)])
+        return (model.q * counts.max(axis=0) - 1.0) / (model.q - 1.0)
+    phase = np.exp(2j * np.pi * np.arange(model.q) / model.q)
+    return np.abs(phase[spins].mean(axis=1))
+
+
+def local_sweep(model, beta, spins, L, update="heatbath", rng=None):
+    """
+        local_sweep(model, beta, spins, L, update="heatbath", rng=None) -> acceptance
+
+    One checkerboard sweep over every chain of `spins` (chains, L*L) in place;
+    L must be even. Metropolis proposes one of the other q - 1 states
+    uniformly. Returns the fraction of sites that changed state.
+    """
+    if update not in LOCAL_UPDATES:
+        raise ValueError(f"unknown update {update!r}; expected one of {LOCAL_UPDATES}")
+    if L % 2:
+        raise ValueError("the checkerboard decomposition needs an even L")
+    rng = np.random.default_rng(rng)
+    q = model.q
+    nb = _neighbours(L)
+    e_bond, e_site = model.bond_energy(), model.site_energy()
+    changed = 0
+    for sites in _sublattices(L):
+        s = spins[:, sites]
+        # local[t, c, i]: energy of site i of chain c in state t
+        local = e_bond[:, spins[:, nb[:, sites]]].sum(axis=2) + e_site[:, None, None]
+        if update == "heatbath":
+            p = np.exp(-beta * (local - local.min(axis=0)))
+            cum = np.cumsum(p, axis=0)
+            u = rng.random(s.shape) * cum[-1]
+            new = np.minimum((cum < u).sum(axis=0), q - 1)
+        else:
+            new = (s + rng.integers(1, q, size=s.shape)) % q
+            dE = (np.take_along_axis(local, new[None], 0)
+                  - np.take_along_axis(local, s[None], 0))[0]
+            new = np.where(rng.random(s.shape) < np.exp(-beta * np.maximum(dE, 0.0)), new, s)
+        changed += np.count_nonzero(new != s)
+        spins[:, sites] = new
+    return changed / spins.size
+
+
+def _bond_probabilities(model, beta):
+    # P[k, s, t]: probability that a cluster site in state s, reflected by R_k,
+    # adds a neighbour in state t
+    q = model.q
+    e = model.bond_energy()
+    R = (np.arange(q)[:, None] - np.arange(q)[None, :]) % q     # R[k, s]
+    return 1.0 - np.exp(np.minimum(0.0, beta * (e[None] - e[R])))
+
+
+def wolff_update(model, beta, spins, L, rng=None):
+    """
+        wolff_update(model, beta, spins, L, rng=None) -> ndarray (chains,)
+
+    Grow and flip one Wolff cluster in every chain of `spins` (chains, L*L)
+    in place; returns the cluster sizes.
+    """
+    if np.any(model.site_energy() != 0):
+        raise ValueError("the Wolff update needs h = 0")
+    rng = np.random.default_rng(rng)
+    n, N = spins.shape
+    q = model.q
+    nb = _neighbours(L)
+    P = _bond_probabilities(model, beta)
+    k = np.ones(n, dtype=int) if q == 2 else rng.integers(0, q, size=n)
+    cluster = np.zeros((n, N), dtype=bool)
+    # the front is a list of (chain, site) pairs added in the last step
+    rows, src = np.arange(n), rng.integers(0, N, size=n)
+    cluster[rows, src] = True
+    while len(rows):
+        dst = nb[:, src]
+        p = P[k[rows], spins[rows, src], spins[rows[None], dst]]
+        add = ~cluster[rows[None], dst] & (rng.random(dst.shape) < p)
+        grown = np.unique((rows[None] * N + dst)[add])
+        cluster.flat[grown] = True
+        rows, src = np.divmod(grown, N)
+    flipped = (k[:, None] - spins) % q
+    spins[cluster] = flipped[cluster]
+    return cluster.sum(axis=1)
+
+
+def binned_error(x, min_bins=32):
+    """
+        binned_error(x, min_bins=32) -> (mean, err, tau)
+
+    Mean of the time series `x` (samples,) or (samples, chains) and its
+    error bar: consecutive samples are averaged in pairs until fewer than
+    `min_bins` bins remain in total, and the largest standard error of the
+    levels is kept. tau is the integrated autocorrelation time in samples,
+    0.5 (err / err_0)^2 with err_0 the naive error of the unbinned series.
+    """
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        x = x[:, None]
+    mean = x.mean()
+    errors = []
+    while True:
+        errors.append(x.std(ddof=1) / np.sqrt(x.size) if x.size > 1 else 0.0)
+        if x.shape[0] < 2 or (x.shape[0] // 2) * x.shape[1] < min_bins:
+            break
+        n = x.shape[0] // 2 * 2
+        x = 0.5 * (x[0:n:2] + x[1:n:2])
+    err = max(errors)
+    tau = 0.5 * (err / errors[0]) ** 2 if errors[0] > 0 else 0.0
+    return mean, err, tau
+
+
+@dataclass
+class MCResult:
+    """
+    Monte Carlo estimates with binned error bars and integrated
+    autocorrelation times (in sweeps), and the per-sweep time series
+    E and m of shape (sweeps, chains).
+    """
+    E: float
+    E_err: float
+    m: float
+    m_err: float
+    tau_E: float
+    tau_m: float
+    acceptance: float
+    cluster_size: float
+    series: dict
+    spins: np.ndarray
+
+
+def monte_carlo(model, beta, L, sweeps=1000, thermalize=200, chains=16, local="heatbath",
+                clusters=0, start="hot", rng=None, spins=None):
+    """
+        monte_carlo(model, beta, L, sweeps=1000, thermalize=200, chains=16,
+                    local="heatbath", clusters=0, start="hot", rng=None,
+                    spins=None) -> MCResult
+
+    Sample `chains` independent copies of `model` on the L x L torus. A sweep
+    is one `local_sweep` (local = "heatbath", "metropolis" or None) followed
+    by `clusters` Wolff flips; `thermalize` sweeps are discarded before
+    `sweeps` measured ones. Chains start from random states ("hot"), from the
+    ordered state 0 ("cold") or from `spins` (chains, L*L), e.g. the final
+    configuration of an earlier run.
+    """
+    if local is None and clusters == 0:
+        raise ValueError("no update: set local or clusters")
+    rng = np.random.default_rng(rng)
+    if spins is None:
+        if start == "hot":
+            spins = rng.integers(0, model.q, size=(chains, L * L))
+        elif start == "cold":
+            spins = np.zeros((chains, L * L), dtype=int)
+        else:
+            raise ValueError(f"unknown start {start!r}")
+    spins = np.array(spins, dtype=int)
+    E = np.empty((sweeps, len(spins)))
+    m = np.empty((sweeps, len(spins)))
+    accepted, sizes = [], []
+    for t in range(thermalize + sweeps):
+        if local is not None:
+            accepted.append(local_sweep(model, beta, spins, L, local, rng))
+        for _ in range(clusters):
+            sizes.append(wolff_update(model, beta, spins, L, rng).mean())
+        if t >= thermalize:
+            E[t - thermalize] = energy(model, spins, L)
+            m[t - thermalize] = magnetization(model, spins)
+    E_mean, E_err, tau_E = binned_error(E)
+    m_mean, m_err, tau_m = binned_error(m)
+    return MCResult(E=E_mean, E_err=E_err, m=m_mean, m_err=m_err, tau_E=tau_E, tau_m=tau_m,
+                    acceptance=float(np.mean(accepted)) if accepted else np.nan,
+                    cluster_size=float(np.mean(sizes)) if sizes else np.nan,
+                    series={"E": E, "m": m}, spins=spins)
@@ -0,0 +1,217 @@
+"""
+Parallel evaluation of observables on a converged environment.
+
+The eight environment tensors live in one contiguous block (see
+`core.Environment`), so publishing them is a single copy into a
+`multiprocessing.shared_memory` segment. Every worker of the pool attaches to
+the segment once, in its initializer, and rebuilds the views on the shared
+buffer; the local tensors are handed to the initializer as well. After that a
+task is a tuple like ("correlator", r, "m"), and neither the tasks nor the
+small results carry arrays, so the environment is never pickled and the
+memory does not grow with the number of workers.
+
+`WorkerPool` serves the other common case, many independent small runs: its
+workers fork from a forkserver that has imported the package and loaded the
+`startup` cache once, so a worker starts in milliseconds instead of paying
+for the numpy/scipy imports.
+"""
+
+from dataclasses import dataclass
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from . import startup
+from .core import Environment, correlator, ctmrg, environment_tensor, transfer_spectrum
+
+
+@dataclass(frozen=True)
+class EnvironmentLayout:
+    """Everything a process needs to attach to a published environment."""
+    name: str
+    c_shapes: tuple
+    t_shapes: tuple
+    dtype: str
+
+
+class SharedEnvironment:
+    """
+    An `Environment` copied once into a shared memory segment. Use as a context
+    manager, or call `close()`, to release the segment.
+    """
+
+    def __init__(self, env):
+        self.shm = SharedMemory(create=True, size=max(env.nbytes, 1))
+        self.layout = EnvironmentLayout(
+            name=self.shm.name,
+            c_shapes=tuple(c.shape for c in env.C),
+            t_shapes=tuple(t.shape for t in env.T),
+            dtype=np.dtype(env.block.dtype).str)
+        self.env = _views(self.layout, self.shm)
+        for view, x in zip(self.env.C + self.env.T, env.C + env.T):
+            view[...] = x
+
+    def close(self):
+        self.env = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _views(layout, shm):
+    block = np.ndarray((shm.size // np.dtype(layout.dtype).itemsize,),
+                       dtype=layout.dtype, buffer=shm.buf)
+    return Environment.empty(layout.c_shapes, layout.t_shapes, layout.dtype, block)
+
+
+def attach(layout):
+    """
+        attach(layout) -> (Environment, SharedMemory)
+
+    Zero-copy view of a published environment; keep the SharedMemory object
+    alive as long as the environment is used.
+    """
+    shm = SharedMemory(name=layout.name)
+    return _views(layout, shm), shm
+
+
+# ============================================================
+# Worker side
+# ============================================================
+
+_WORKER = {}
+
+
+def _init_worker(layout, lt):
+    env, shm = attach(layout)
+    _WORKER.update(env=env, shm=shm, lt=lt)
+
+
+def evaluate(task, env=None, lt=None):
+    """
+    Evaluate one task on `env` (defaults to the worker's shared environment):
+
+        ("correlator", r, name)    <x_0 x_r> along a row
+        ("impurity", name)         <x> of lt.impurities[name]
+        ("spectrum", k)            k leading eigenvalues of the column transfer matrix
+    """
+    env = _WORKER["env"] if env is None else env
+    lt = _WORKER["lt"] if lt is None else lt
+    kind, *args = task
+    if kind == "correlator":
+        r, name = args
+        return correlator(env, lt, r, name)
+    if kind == "impurity":
+        (name,) = args
+        E = environment_tensor(env)
+        return np.sum(E * lt.impurities[name]) / np.sum(E * lt.a)
+    if kind == "spectrum":
+        (k,) = args
+        return transfer_spectrum(env, lt.a, k)
+    raise ValueError(f"unknown task {kind!r}")
+
+
+# ============================================================
+# Pool
+# ============================================================
+
+class ObservablePool:
+    """
+    Process pool evaluating tasks on one converged environment held in shared
+    memory. `processes` defaults to the number of cores and `context` to the
+    platform's default start method.
+    """
+
+    def __init__(self, env, lt, processes=None, context=None):
+        self.shared = SharedEnvironment(env)
+        self.names = tuple(lt.impurities)
+        ctx = get_context(context)
+        self.pool = ctx.Pool(processes, initializer=_init_worker,
+                             initargs=(self.shared.layout, lt))
+
+    def map(self, tasks, chunksize=1):
+        """Results of `evaluate` for every task, in order."""
+        return self.pool.map(evaluate, list(tasks), chunksize)
+
+    def correlators(self, distances, name="m", connected=False):
+        """<x_0 x_r> for every r in `distances`; minus <x>^2 if `connected`."""
+        tasks = [("correlator", int(r), name) for r in distances]
+        if connected:
+            tasks.append(("impurity", name))
+        values = self.map(tasks)
+        if connected:
+            mean = values.pop()
+            return np.array(values) - mean ** 2
+        return np.array(values)
+
+    def impurities(self, names=None):
+        """<x> for every impurity name (all of lt.impurities by default)."""
+        names = list(self.names if names is None else names)
+        return dict(zip(names, self.map([("impurity", name) for name in names])))
+
+    def spectrum(self, k=2):
+        return self.map([("spectrum", k)])[0]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.shared.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ============================================================
+# Forkserver pool for independent runs
+# ============================================================
+
+def run_point(point):
+    """
+        run_point((model, beta, chi, kwargs)) -> (Observables, iterations)
+
+    One CTMRG run with the local tensors from the `startup` table.
+    """
+    model, beta, chi, kwargs = point
+    res = ctmrg(startup.local_tensors(model, beta), chi, **kwargs)
+    return res.observables, res.iterations
+
+
+class WorkerPool:
+    """
+    Process pool whose workers fork from a forkserver that has imported the
+    modules in `preload` (by default `_preload`, which loads the package and
+    the `startup` cache). The preload list is set on the forkserver context
+    before its server starts, so it applies to the first pool created in a
+    process.
+    """
+
+    def __init__(self, processes=None, preload=("src_codes._preload",)):
+        ctx = get_context("forkserver")
+        ctx.set_forkserver_preload(list(preload))
+        self.pool = ctx.Pool(processes)
+
+    def map(self, fn, items, chunksize=1):
+        return self.pool.map(fn, list(items), chunksize)
+
+    def run(self, model, betas, chi, **kwargs):
+        """(Observables, iterations) of `ctmrg` at every beta."""
+        return self.map(run_point, [(model, beta, chi, kwargs) for beta in betas])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
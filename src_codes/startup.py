@@ -0,0 +1,108 @@
+"""
+Precomputed state for short-lived processes.
+
+A sweep worker that evaluates one small-chi point spends most of its life
+importing numpy/scipy and rebuilding what every other worker rebuilt before
+it: the local tensors of the model and the `ncon` contraction plans of the
+enlarged corners and environment contractions. This module keeps both in a
+cache directory (CTMRG_STARTUP_CACHE):
+
+    plans.json     the entries of `core.NCON_PLANS`
+    tensors.npz    the arrays of every `LocalTensors` built through
+                   `local_tensors`, with a JSON index of (model, beta)
+
+`load()` seeds the in-memory tables from disk and `save()` writes them back.
+`parallel.WorkerPool` imports `_preload`, which calls `load()`, in its
+forkserver, so the imports and the cache are paid once per pool and every
+worker forks with them in place.
+"""
+
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from . import core
+from .core import LocalTensors, Model
+
+STARTUP_CACHE = os.environ.get(
+    "CTMRG_STARTUP_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "ctmrg", "startup"))
+
+_TENSORS = {}   # (name, q, J, h, beta) -> LocalTensors
+_FIELDS = ("a", "w", "Q_out", "Q_in")
+
+
+def _tensor_key(model, beta):
+    return (model.name, int(model.q), float(model.J), float(model.h), float(beta))
+
+
+def local_tensors(model, beta):
+    """`core.local_tensors`, memoized per (model, beta) and seeded by `load`."""
+    key = _tensor_key(model, beta)
+    lt = _TENSORS.get(key)
+    if lt is None:
+        lt = _TENSORS[key] = core.local_tensors(model, beta)
+    return lt
+
+
+def save(path=STARTUP_CACHE):
+    """Write the current plans and local tensors to the directory `path`."""
+    os.makedirs(path, exist_ok=True)
+    plans = [[[list(lab) for lab in labels], [list(s) for s in shapes], [list(p) for p in pairs],
+              flops] for (labels, shapes), (pairs, flops) in core.NCON_PLANS.items()]
+    arrays, index = {}, []
+    for i, (key, lt) in enumerate(_TENSORS.items()):
+        index.append(key)
+        for name in _FIELDS:
+            arrays[f"{i}.{name}"] = getattr(lt, name)
+        for name, x in lt.impurities.items():
+            arrays[f"{i}.imp.{name}"] = x
+    tmp = os.path.join(path, f"plans.json.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(plans, f)
+    os.replace(tmp, os.path.join(path, "plans.json"))
+    tmp = os.path.join(path, f"tensors.{os.getpid()}.tmp.npz")
+    np.savez(tmp, index=np.array(json.dumps(index)), **arrays)
+    os.replace(tmp, os.path.join(path, "tensors.npz"))
+
+
+def load(path=STARTUP_CACHE):
+    """
+        load(path=STARTUP_CACHE) -> (n_plans, n_tensors)
+
+    Seed `core.NCON_PLANS` and the local tensor table from the directory
+    `path`; missing or unreadable files are skipped.
+    """
+    n_plans = n_tensors = 0
+    try:
+        with open(os.path.join(path, "plans.json")) as f:
+            for labels, shapes, pairs, flops in json.load(f):
+                key = (tuple(map(tuple, labels)), tuple(map(tuple, shapes)))
+                core.NCON_PLANS[key] = (tuple(map(tuple, pairs)), flops)
+                n_plans += 1
+    except (OSError, ValueError):
+        pass
+    try:
+        with np.load(os.path.join(path, "tensors.npz")) as data:
+            for i, key in enumerate(json.loads(str(data["index"]))):
+                name, q, J, h, beta = key
+                prefix = f"{i}."
+                impurities = {k[len(prefix) + 4:]: data[k] for k in data.files
+                              if k.startswith(prefix + "imp.")}
+                _TENSORS[tuple(key)] = LocalTensors(
+                    **{field: data[prefix + field] for field in _FIELDS}, beta=beta,
+                    impurities=impurities, model=Model(name, q, J, h))
+                n_tensors += 1
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        pass
+    return n_plans, n_tensors
+
+
+def precompute(models, betas, path=STARTUP_CACHE):
+    """Build the local tensors of every model at every beta and save them with the current plans."""
+    for model in models:
+        for beta in betas:
+            local_tensors(model, beta)
+    save(path)
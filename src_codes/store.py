@@ -0,0 +1,232 @@
+"""
+Columnar store of sweep results.
+
+Every record is one row of fixed columns (`COLUMNS`): what was computed
+(method, model, q, chi, L, beta, J, h, the vertical coupling Jy and the
+boundary of a strip, and the CTMRG tolerance and initial environment), the
+observables f, m, E, xi, and the truncation error, iteration count,
+convergence flag and wall time of the run.
+Rows are buffered in memory and written as append-only column chunks, one
+.npz per chunk holding one array per column; chunks are never rewritten.
+
+Reading concatenates the chunks once into one array per column, so queries
+over millions of points are vectorized masks (`ResultStore.select`) rather
+than per-file parsing. The index from `KEY` to row is built from the columns
+on the first lookup and updated on append; `ResultStore.run` and
+`ResultStore.strip` consult it and only compute points that are not stored
+yet. Unconverged CTMRG rows are kept but never reused, so asking again (e.g.
+with a larger max_iter) reruns the point. Chunks are named by time, process
+and a random suffix, so several processes can append to one store.
+
+Methods: "ctmrg" (chi is the bond dimension, L = 0, Jy = J, periodic is
+False) and "strip" (exact row transfer matrix of a strip of width L, chi = 0,
+m and E are nan, init is "").
+"""
+
+import glob
+import os
+import time
+import uuid
+
+import numpy as np
+
+from .core import local_tensors, ctmrg
+from .row_transfer import strip_spectrum
+
+COLUMNS = {
+    "method": "U8", "model": "U8", "q": np.int64, "chi": np.int64, "L": np.int64,
+    "beta": np.float64, "J": np.float64, "h": np.float64, "Jy": np.float64,
+    "periodic": np.bool_, "tol": np.float64, "init": "U8",
+    "f": np.float64, "m": np.float64, "E": np.float64, "xi": np.float64,
+    "trunc_err": np.float64, "iterations": np.int64, "converged": np.bool_,
+    "time": np.float64,
+}
+KEY = ("method", "model", "q", "chi", "L", "beta", "J", "h", "Jy", "periodic", "tol", "init")
+STRIP_SOLVER = ("k",)     # strip_spectrum arguments that do not change the record
+
+
+class ResultStore:
+    """
+    Results under the directory `path`; pending rows are written as a new
+    chunk once there are `chunk_rows` of them, and on `flush()`.
+    """
+
+    def __init__(self, path, chunk_rows=4096):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.pending = []
+        self._stored = None     # columns of the chunks on disk
+        self._view = None       # stored + pending
+        self._index = None
+
+    # ------------------------------------------------------------
+    # storage
+
+    def _chunks(self):
+        return sorted(glob.glob(os.path.join(self.path, "chunk-*.npz")))
+
+    def _load(self):
+        if self._stored is None:
+            parts = []
+            for name in self._chunks():
+                with np.load(name) as data:
+                    n = len(data["f"])
+                    # chunks from before a column existed get its default
+                    parts.append({c: data[c] if c in data.files else
+                                  np.full(n, _default(dtype), dtype) for c, dtype in COLUMNS.items()})
+            self._stored = {c: np.concatenate([p[c] for p in parts]).astype(dtype)
+                            if parts else np.empty(0, dtype)
+                            for c, dtype in COLUMNS.items()}
+        return self._stored
+
+    @staticmethod
+    def _stack(rows):
+        return {name: np.array([row[name] for row in rows], dtype=dtype)
+                for name, dtype in COLUMNS.items()}
+
+    def flush(self):
+        """Write the pending rows as one chunk."""
+        if not self.pending:
+            return
+        stored = self._load()
+        new = self._stack(self.pending)
+        os.makedirs(self.path, exist_ok=True)
+        tag = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp = os.path.join(self.path, f"tmp-{tag}.npz")
+        np.savez(tmp, **new)
+        os.replace(tmp, os.path.join(self.path, f"chunk-{tag}.npz"))
+        self._stored = {c: np.concatenate([stored[c], new[c]]) for c in COLUMNS}
+        self._view = self._stored
+        self.pending = []
+
+    @property
+    def columns(self):
+        """Dict of column arrays over every stored and pending row."""
+        if self._view is None:
+            stored = self._load()
+            if self.pending:
+                new = self._stack(self.pending)
+                self._view = {c: np.concatenate([stored[c], new[c]]) for c in COLUMNS}
+            else:
+                self._view = stored
+        return self._view
+
+    def __len__(self):
+        return len(self._load()["f"]) + len(self.pending)
+
+    # ------------------------------------------------------------
+    # records and queries
+
+    def append(self, **row):
+        """Add one record; columns not given are nan (0 for integers, False for flags, "" for labels)."""
+        unknown = set(row) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown columns {sorted(unknown)}")
+        full = {c: np.asarray(row.get(c, _default(t)), t).item() for c, t in COLUMNS.items()}
+        if self._index is not None:
+            self._index[_key(full)] = len(self)
+        self.pending.append(full)
+        self._view = None
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+
+    def lookup(self, **key):
+        """Row (dict) stored under the full KEY, or None."""
+        stored = self._load()
+        if self._index is None:
+            rows = zip(*(stored[c].tolist() for c in KEY))
+            self._index = {k: i for i, k in enumerate(rows)}
+            for i, row in enumerate(self.pending, start=len(stored["f"])):
+                self._index[_key(row)] = i
+        i = self._index.get(_key(key))
+        if i is None:
+            return None
+        if i >= len(stored["f"]):
+            return dict(self.pending[i - len(stored["f"])])
+        return {c: stored[c][i].item() for c in COLUMNS}
+
+    def select(self, **conditions):
+        """
+            select(**conditions) -> dict of column arrays
+
+        Rows where every named column equals the given value, or lies in
+        [lo, hi] if a (lo, hi) pair is given; e.g.
+        select(method="ctmrg", chi=32, beta=(0.4, 0.5)).
+        """
+        cols = self.columns
+        mask = np.ones(len(cols["f"]), dtype=bool)
+        for name, value in conditions.items():
+            if isinstance(value, tuple):
+                mask &= (cols[name] >= value[0]) & (cols[name] <= value[1])
+            else:
+                mask &= cols[name] == value
+        return {c: cols[c][mask] for c in COLUMNS}
+
+    # ------------------------------------------------------------
+    # memoized runs
+
+    def run(self, model, beta, chi, cache=None, tol=1e-10, init=None, **kwargs):
+        """
+            run(model, beta, chi, cache=None, tol=1e-10, init=None, **kwargs) -> dict
+
+        Stored converged CTMRG record of (model, beta, chi) at this `tol` and
+        `init`, computing and appending it first if missing. The other
+        `kwargs` (backend, precision, max_iter, ...) only change how the
+        fixed point is reached and go to `ctmrg`, or to `cache.run` when an
+        `EnvironmentCache` is given.
+        """
+        key = dict(method="ctmrg", model=model.name, q=model.q, chi=chi, L=0,
+                   beta=beta, J=model.J, h=model.h, Jy=model.J, periodic=False, tol=tol,
+                   init=init or "")
+        row = self.lookup(**key)
+        if row is not None and row["converged"]:
+            return row
+        t0 = time.perf_counter()
+        if cache is None:
+            res = ctmrg(local_tensors(model, beta), chi, tol=tol, init=init, **kwargs)
+        else:
+            res = cache.run(model, beta, chi, tol=tol, init=init, **kwargs)
+        obs = res.observables
+        self.append(**key, f=obs.f, m=obs.m, E=obs.E, xi=obs.xi, trunc_err=res.trunc_err,
+                    iterations=res.iterations, converged=res.converged,
+                    time=time.perf_counter() - t0)
+        return self.lookup(**key)
+
+    def strip(self, L, beta, J=1.0, h=0.0, Jy=None, periodic=True, tol=1e-12, **kwargs):
+        """
+            strip(L, beta, J=1.0, h=0.0, Jy=None, periodic=True, tol=1e-12, **kwargs) -> dict
+
+        Stored record of `strip_spectrum` for the Ising strip; of its other
+        arguments only the solver's `k` may be given.
+        """
+        unknown = set(kwargs) - set(STRIP_SOLVER)
+        if unknown:
+            raise ValueError(f"strip arguments {sorted(unknown)} are not part of the record")
+        Jy = J if Jy is None else Jy
+        key = dict(method="strip", model="ising", q=2, chi=0, L=L, beta=beta, J=J, h=h,
+                   Jy=Jy, periodic=periodic, tol=tol, init="")
+        row = self.lookup(**key)
+        if row is not None:
+            return row
+        t0 = time.perf_counter()
+        res = strip_spectrum(L, beta, J=J, h=h, Jy=Jy, periodic=periodic, tol=tol, **kwargs)
+        self.append(**key, f=res.free_energy, xi=res.xi, trunc_err=0.0, converged=True,
+                    time=time.perf_counter() - t0)
+        return self.lookup(**key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+def _default(dtype):
+    kind = np.dtype(dtype).kind
+    return np.nan if kind == "f" else "" if kind == "U" else 0
+
+
+def _key(row):
+    return (str(row["method"]), str(row["model"]), int(row["q"]), int(row["chi"]),
+            int(row["L"]), float(row["beta"]), float(row["J"]), float(row["h"]),
+            float(row["Jy"]), bool(row["periodic"]), float(row["tol"]), str(row["init"]))
@@ -0,0 +1,281 @@
+"""
+1D transfer-matrix renormalization group (TMRG) for inhomogeneous chains.
+
+We compute Z = Tr(T_1 T_2 ... T_N) for a periodic chain whose bond transfer
+matrices T_i carry site-dependent couplings J_i (and fields h_i), following
+the appendix of the slides:
+
+    Grow:      L' = L . T        R' = T . R
+    Truncate:  rho = R' L' = U S V^T,  keep the chi largest singular values
+               L_new = S^(1/2) V^T      R_new = U S^(1/2)
+
+L has shape (chi, d) and R has shape (d, chi). The chi leg is the compressed
+"trace" bond closing the ring (the double arc in fig_1d_tmrg_environments),
+the d leg is the open spin where the next transfer matrix is absorbed.
+L grows from site 1 to the right and R from site N to the left until they
+meet in the middle, so that Z = Tr(L R).  With chi >= d nothing is discarded
+and the result is exact; for q-state chains chi < q is a controlled
+approximation.
+
+Every routine works on a leading batch axis, so hundreds of disorder
+realizations are contracted together with stacked matmul/SVD calls instead
+of a Python loop over samples.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# ============================================================
+# Bond transfer matrices
+# ============================================================
+
+def _bond_fields(J, h, h_next):
+    # Fields of the left and right spin of every bond; periodic by default.
+    h = np.broadcast_to(np.asarray(h, dtype=float), J.shape)
+    if h_next is None:
+        h_next = np.roll(h, -1, axis=-1)
+    else:
+        h_next = np.broadcast_to(np.asarray(h_next, dtype=float), J.shape)
+    return h, h_next
+
+
+def ising_transfer(beta, J, h=0.0, h_next=None):
+    """
+        ising_transfer(beta, J, h=0.0, h_next=None) -> ndarray (..., N, 2, 2)
+
+    Ising bond transfer matrices T_i[s, s'] = exp(beta*J_i*s*s' + beta*(h_i*s + h_{i+1}*s')/2)
+    with s, s' in {+1, -1} (index 0 is spin up). `J` has shape (..., N); `h` is a
+    scalar or broadcastable to it. The field of each site is split evenly between
+    its two bonds, so the chain is periodic with spin N+1 identified with spin 1,
+    unless the fields of the right-hand spins are passed explicitly as `h_next`
+    (used when a chain is built piece by piece).
+    """
+    J = np.asarray(J, dtype=float)
+    h, h_next = _bond_fields(J, h, h_next)
+    s = np.array([1.0, -1.0])
+    exponent = (J[..., None, None] * s[:, None] * s[None, :]
+                + 0.5 * h[..., None, None] * s[:, None]
+                + 0.5 * h_next[..., None, None] * s[None, :])
+    return np.exp(beta * exponent)
+
+
+def potts_transfer(beta, J, q, h=0.0, h_next=None):
+    """
+        potts_transfer(beta, J, q, h=0.0, h_next=None) -> ndarray (..., N, q, q)
+
+    q-state Potts bond transfer matrices T_i[s, s'] = exp(beta*J_i*delta(s, s')
+    + beta*(h_i*delta(s, 0) + h_{i+1}*delta(s', 0))/2).
+    """
+    J = np.asarray(J, dtype=float)
+    h, h_next = _bond_fields(J, h, h_next)
+    delta = np.eye(q)
+    e0 = delta[0]
+    exponent = (J[..., None, None] * delta
+                + 0.5 * h[..., None, None] * e0[:, None]
+                + 0.5 * h_next[..., None, None] * e0[None, :])
+    return np.exp(beta * exponent)
+
+
+# ============================================================
+# Grow and truncate
+# ============================================================
+
+def grow_left(L, T):
+    """L' = L . T, batched over the leading axes."""
+    return L @ T
+
+
+def grow_right(R, T):
+    """R' = T . R, batched over the leading axes."""
+    return T @ R
+
+
+def truncate(L, R, chi):
+    """
+        truncate(L, R, chi) -> (L_new, R_new, log_norm, trunc_err)
+
+    SVD of the ring matrix rho = R L (the product of everything already absorbed,
+    read from the open spin of R around the trace bond to the open spin of L).
+    Keeping its chi largest singular values gives the new environments
+    L_new = S^(1/2) V^T and R_new = U S^(1/2), normalized so that the largest
+    singular value is one; `log_norm` returns what was divided out and
+    `trunc_err` the discarded weight sum(s_discarded)/sum(s).
+    """
+    rho = R @ L
+    U, s, Vh = np.linalg.svd(rho)
+    s0 = s[..., :1]
+    s = s / s0
+    trunc_err = s[..., chi:].sum(axis=-1) / s.sum(axis=-1)
+    sq = np.sqrt(s[..., :chi])
+    L_new = sq[..., :, None] * Vh[..., :chi, :]
+    R_new = U[..., :, :chi] * sq[..., None, :]
+    return L_new, R_new, np.log(s0[..., 0]), trunc_err
+
+
+# ============================================================
+# Driver
+# ============================================================
+
+@dataclass
+class TMRGResult:
+    """Per-sample output of `tmrg`; every field has the batch shape of the input."""
+    log_z: np.ndarray
+    free_energy: np.ndarray
+    magnetization: np.ndarray
+    trunc_err: np.ndarray
+
+
+def tmrg(T, chi, beta=1.0, spin=None):
+    """
+        tmrg(T, chi, beta=1.0, spin=None) -> TMRGResult
+
+    Contract Z = Tr(T_1 ... T_N) for a stack of chains. `T` has shape (..., N, d, d)
+    where the leading axes enumerate disorder realizations. L and R are grown from
+    both ends, one transfer matrix per side and step, and truncated to `chi` after
+    every step. `spin` is the diagonal of the local operator measured at the spin
+    where L and R meet (defaults to +1/-1 for d = 2 and to delta(s, 0) otherwise).
+
+    The free energy per site is f = -ln Z / (beta N); `trunc_err` is the largest
+    discarded weight seen during the run.
+    """
+    T = np.asarray(T, dtype=float)
+    *batch, N, d, _ = T.shape
+    if spin is None:
+        spin = np.array([1.0, -1.0]) if d == 2 else np.eye(d)[0]
+
+    L = np.broadcast_to(np.eye(d), (*batch, d, d))
+    R = np.broadcast_to(np.eye(d), (*batch, d, d))
+    log_z = np.zeros(batch)
+    trunc_err = np.zeros(batch)
+    for k in range(N // 2):
+        L = grow_left(L, T[..., k, :, :])
+        R = grow_right(R, T[..., N - 1 - k, :, :])
+        L, R, log_norm, err = truncate(L, R, chi)
+        log_z += log_norm
+        trunc_err = np.maximum(trunc_err, err)
+    if N % 2:
+        L = grow_left(L, T[..., N // 2, :, :])
+
+    # L ends on the meeting spin and R starts on it: Z = Tr(L R)
+    z = np.einsum('...as,...sa->...', L, R)
+    zs = np.einsum('...as,s,...sa->...', L, spin, R)
+    log_z = log_z + np.log(z)
+    return TMRGResult(log_z=log_z,
+                      free_energy=-log_z / (beta * N),
+                      magnetization=zs / z,
+                      trunc_err=trunc_err)
+
+
+# ============================================================
+# Streaming contraction of very long chains
+# ============================================================
+
+def open_couplings(path):
+    """Memory-map a (N, 2) .npy file of (J_i, h_i) rows for `stream_chain`."""
+    return np.load(path, mmap_mode='r')
+
+
+def chain_product(T):
+    """
+        chain_product(T) -> (P, log_scale)
+
+    Ordered product T_1 T_2 ... T_n of a stack (n, d, d), evaluated as a binary tree
+    of stacked matmuls. Every partial product is divided by its largest entry, so
+    P has max |P| = 1 and the true product is exp(log_scale) * P.
+    """
+    T = np.array(T, dtype=float)
+    log_scale = np.zeros(len(T))
+    while len(T) > 1:
+        if len(T) % 2:
+            # fold the odd one out into its left neighbour
+            T[-2] = T[-2] @ T[-1]
+            log_scale[-2] += log_scale[-1]
+            T, log_scale = T[:-1], log_scale[:-1]
+        T = T[0::2] @ T[1::2]
+        log_scale = log_scale[0::2] + log_scale[1::2]
+        norm = np.abs(T).max(axis=(1, 2))
+        T /= norm[:, None, None]
+        log_scale += np.log(norm)
+    return T[0], log_scale[0]
+
+
+@dataclass
+class StreamResult:
+    """Output of `stream_chain`, observables ordered like the requested sites."""
+    log_z: float
+    free_energy: float
+    sites: np.ndarray
+    magnetization: np.ndarray
+    bond_correlation: np.ndarray
+
+
+def stream_chain(couplings, beta, sites=(), chunk=1 << 16, transfer=ising_transfer,
+                 spin=None, callback=None):
+    """
+        stream_chain(couplings, beta, sites=(), chunk=65536, transfer=ising_transfer,
+                     spin=None, callback=None) -> StreamResult
+
+    Exact Z = Tr(T_1 ... T_N) for one very long periodic chain whose couplings
+    (J_i, h_i) are the rows of `couplings`, typically an `np.memmap` from
+    `open_couplings`. Rows are read `chunk` at a time, turned into transfer
+    matrices with `transfer(beta, J, h=h, h_next=h_next)` and multiplied into a
+    running product with log-scale normalization, so memory does not depend on N.
+
+    For every requested site j (0-based) we carry the running product with the
+    spin operator inserted at j, and with it inserted at j and j+1, which gives
+    <s_j> and <s_j s_{j+1}> once the ring is closed. `callback(n_done, log_z)` is
+    invoked after every chunk with the log of the trace of the partial product.
+    """
+    N = len(couplings)
+    sites = np.unique(np.asarray(sites, dtype=int) % N)
+    # spins where an operator is inserted: every site j and its right neighbour j+1
+    cut_sites = np.union1d(sites, sites[sites + 1 < N] + 1)
+    M = None
+    log_scale = 0.0
+    X = None                  # running products with insertions, (2, K, d, d)
+    opened = np.zeros(len(sites), dtype=bool)
+    for start in range(0, N, chunk):
+        stop = min(start + chunk, N)
+        rows = np.asarray(couplings[start:stop], dtype=float)
+        h_next = np.append(rows[1:, 1], couplings[stop % N][1])
+        T = transfer(beta, rows[:, 0], h=rows[:, 1], h_next=h_next)
+        if M is None:
+            d = T.shape[-1]
+            if spin is None:
+                spin = np.array([1.0, -1.0]) if d == 2 else np.eye(d)[0]
+            M = np.eye(d)
+            X = np.zeros((2, len(sites), d, d))
+
+        # split the chunk at the spins carrying an insertion
+        cuts = cut_sites[(cut_sites >= start) & (cut_sites < stop)] - start
+        bounds = np.concatenate(([0], cuts, [stop - start]))
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b > a:
+                P, log_p = chain_product(T[a:b])
+                norm = np.abs(M @ P).max()
+                M = M @ P / norm
+                X[:, opened] = X[:, opened] @ P / norm
+                log_scale += log_p + np.log(norm)
+            if b == stop - start:
+                continue
+            # spin start + b sits between T_{start+b-1} and T_{start+b}
+            j = start + b
+            closing = opened & (sites == j - 1)
+            X[1, closing] *= spin[None, None, :]
+            new = sites == j
+            X[:, new] = M * spin[None, :]
+            opened |= new
+        if callback is not None:
+            callback(stop, log_scale + np.log(np.trace(M)))
+
+    # the bond (N-1, 0) closes the ring on the first spin
+    X[1, sites == N - 1] = spin[:, None] * X[1, sites == N - 1]
+    z = np.trace(M)
+    log_z = log_scale + np.log(z)
+    return StreamResult(log_z=log_z,
+                        free_energy=-log_z / (beta * N),
+                        sites=sites,
+                        magnetization=np.trace(X[0], axis1=-2, axis2=-1) / z,
+                        bond_correlation=np.trace(X[1], axis1=-2, axis2=-1) / z)
@@ -0,0 +1,217 @@
+"""
+Variational uniform MPS (VUMPS) for the fixed point of the row transfer matrix.
+
+The upper half of the lattice, seen from below, is a uniform MPS with tensors
+A[l, p, r] whose physical leg p connects to the u leg of a row of local tensors
+a[r, d, l, u]; it is the leading eigenvector of that row (the MPO of the
+slides). VUMPS keeps the MPS in the mixed gauge
+
+    A_C = A_L C = C A_R,
+
+and alternates two steps until the gauge condition holds:
+
+    1. Left and right fixed points F_L, F_R of the channels built from A_L and A_R
+       with one a in between (Arnoldi, `eigs`).
+    2. New A_C and C as the leading eigenvectors of the effective operators
+       H_AC = F_L a F_R and H_C = F_L F_R (Lanczos, `eigsh`), followed by
+       A_L, A_R from the polar decompositions of A_C and C.
+
+For a local tensor with the full symmetry of the square lattice the lower half
+is the same MPS, and the fixed point converts into a CTMRG environment: in the
+basis where C = diag(s), every edge is T = s^(-1/2) A_C s^(-1/2) and every
+corner is diag(s^(1/2)), since two corners meeting at a cut reproduce the
+Schmidt values of the boundary MPS. The observables of `core` then apply
+unchanged.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.sparse.linalg import LinearOperator, eigs, eigsh
+
+from .core import Environment, Observables, initial_environment, is_symmetric, observables
+
+
+# ============================================================
+# Fixed points and effective operators
+# ============================================================
+
+SYMMETRY_TOL = 1e-10
+
+def leading_eigenvector(matvec, n, v0=None, hermitian=False):
+    """
+        leading_eigenvector(matvec, n, v0=None, hermitian=False) -> (lambda, v)
+
+    Eigenvalue of largest magnitude and its real eigenvector for an n x n
+    operator given by `matvec`, from Lanczos (`hermitian`) or Arnoldi; tiny
+    problems are diagonalized densely, and a `hermitian` one that is not
+    symmetric to SYMMETRY_TOL raises ValueError.
+    """
+    if n <= 64:
+        M = np.stack([matvec(e) for e in np.eye(n)], axis=1)
+        if hermitian and np.abs(M - M.T).max() > SYMMETRY_TOL * np.abs(M).max():
+            raise ValueError("operator passed as hermitian is not symmetric")
+        vals, vecs = np.linalg.eigh(M) if hermitian else np.linalg.eig(M)
+        i = np.argmax(np.abs(vals))
+        return vals[i].real, vecs[:, i].real
+    op = LinearOperator((n, n), matvec=matvec, dtype=float)
+    solver = eigsh if hermitian else eigs
+    vals, vecs = solver(op, k=1, which='LM', v0=v0)
+    v = vecs[:, 0]
+    # fix the arbitrary complex phase before dropping the imaginary part
+    v = v * np.exp(-1j * np.angle(v[np.argmax(np.abs(v))]))
+    return vals[0].real, v.real
+
+
+def left_fixed_point(A_L, a, F0=None):
+    """F_L[alpha, m, beta] with F_L (A_L a A_L) = lambda F_L; legs top MPS, a, bottom MPS."""
+    chi, D = A_L.shape[0], a.shape[2]
+
+    def matvec(v):
+        x = np.tensordot(v.reshape(chi, D, chi), A_L, axes=([0], [0]))   # [m, b, p, a']
+        x = np.tensordot(x, a, axes=([0, 2], [2, 3]))                     # [b, a', m', q]
+        x = np.tensordot(x, A_L, axes=([0, 3], [0, 1]))                   # [a', m', b']
+        return x.reshape(-1)
+
+    v0 = None if F0 is None else F0.reshape(-1)
+    _, v = leading_eigenvector(matvec, chi * D * chi, v0, hermitian=False)
+    return v.reshape(chi, D, chi)
+
+
+def right_fixed_point(A_R, a, F0=None):
+    """F_R[alpha, m, beta] with (A_R a A_R) F_R = lambda F_R."""
+    chi, D = A_R.shape[2], a.shape[0]
+
+    def matvec(v):
+        x = np.tensordot(A_R, v.reshape(chi, D, chi), axes=([2], [0]))   # [a, p, m', b']
+        x = np.tensordot(x, a, axes=([1, 2], [3, 0]))                     # [a, b', q, m]
+        x = np.tensordot(x, A_R, axes=([1, 2], [2, 1]))                   # [a, m, b]
+        return x.reshape(-1)
+
+    v0 = None if F0 is None else F0.reshape(-1)
+    _, v = leading_eigenvector(matvec, chi * D * chi, v0, hermitian=False)
+    return v.reshape(chi, D, chi)
+
+
+def apply_h_ac(A_C, F_L, F_R, a):
+    """H_AC acting on A_C[l, p, r]: F_L a F_R wrapped around one site."""
+    x = np.tensordot(F_L, A_C, axes=([0], [0]))                  # [m, b, p, a']
+    x = np.tensordot(x, a, axes=([0, 2], [2, 3]))                # [b, a', m', q]
+    x = np.tensordot(x, F_R, axes=([1, 2], [0, 1]))              # [b, q, b']
+    return x
+
+
+def apply_h_c(C, F_L, F_R):
+    """H_C acting on the bond matrix C[l, r]."""
+    x = np.tensordot(F_L, C, axes=([0], [0]))                    # [m, b, a']
+    return np.tensordot(x, F_R, axes=([2, 0], [0, 1]))           # [b, b']
+
+
+def _polar(M):
+    U, _, Vh = np.linalg.svd(M, full_matrices=False)
+    return U @ Vh
+
+
+def mixed_gauge(A_C, C):
+    """
+        mixed_gauge(A_C, C) -> (A_L, A_R, eps)
+
+    Isometries closest to A_C C^-1 and C^-1 A_C, and the gauge error
+    eps = max(|A_C - A_L C|, |A_C - C A_R|).
+    """
+    chi, d, _ = A_C.shape
+    Q_C = _polar(C)
+    A_L = (_polar(A_C.reshape(chi * d, chi)) @ Q_C.T).reshape(chi, d, chi)
+    A_R = (Q_C.T @ _polar(A_C.reshape(chi, d * chi))).reshape(chi, d, chi)
+    eps = max(np.linalg.norm(A_C - np.tensordot(A_L, C, axes=([2], [0]))),
+              np.linalg.norm(A_C - np.tensordot(C, A_R, axes=([1], [0]))))
+    return A_L, A_R, eps
+
+
+# ============================================================
+# Driver
+# ============================================================
+
+@dataclass
+class VUMPSResult:
+    """Fixed point in mixed gauge, the equivalent CTMRG environment and run statistics."""
+    A_L: np.ndarray
+    A_R: np.ndarray
+    A_C: np.ndarray
+    C: np.ndarray
+    env: Environment
+    observables: Observables
+    iterations: int
+    converged: bool
+    eps: float
+
+
+def to_environment(A_C, C, cutoff=1e-10):
+    """
+        to_environment(A_C, C, cutoff=1e-10) -> Environment
+
+    CTMRG environment of a fully symmetric local tensor from the VUMPS fixed
+    point: C_i = diag(s^(1/2)) and T_i = s^(-1/2) A_C s^(-1/2) in the basis where
+    C = diag(s), normalized like the CTMRG tensors. Schmidt values below
+    `cutoff` relative to the largest are dropped, since s^(-1/2) would amplify
+    the noise of their components.
+    """
+    U, s, Vh = np.linalg.svd(C)
+    s = s / s[0]
+    keep = max(1, int(np.count_nonzero(s > cutoff)))
+    U, s, Vh = U[:, :keep], s[:keep], Vh[:keep]
+    A = np.tensordot(np.tensordot(U.T, A_C, axes=([1], [0])), Vh.T, axes=([2], [0]))
+    inv = 1.0 / np.sqrt(s)
+    T = inv[:, None, None] * A * inv[None, None, :]
+    T = T / np.abs(T).max()
+    corner = np.diag(np.sqrt(s))
+    return Environment([corner.copy() for _ in range(4)], [T.copy() for _ in range(4)])
+
+
+def initial_mps(lt, chi, init="fixed", rng=None):
+    """
+    Starting A_C of bond dimension chi: the edge tensor of `initial_environment`
+    padded with small random entries, so that "fixed" selects an ordered state.
+    """
+    rng = np.random.default_rng(rng)
+    T = initial_environment(lt, init).T[3]
+    A = 1e-3 * rng.standard_normal((chi, lt.d, chi))
+    n = min(chi, T.shape[0])
+    A[:n, :, :n] += T[:n, :, :n]
+    return A / np.linalg.norm(A)
+
+
+def vumps(lt, chi, tol=1e-10, max_iter=200, init="fixed", xi=True, rng=None):
+    """
+        vumps(lt, chi, tol=1e-10, max_iter=200, init="fixed", xi=True, rng=None) -> VUMPSResult
+
+    Iterate VUMPS for the boundary MPS of bond dimension chi until the gauge
+    error drops below `tol`, then measure through `core.observables` on the
+    equivalent environment. Requires a local tensor with the full symmetry of
+    the square lattice.
+    """
+    a = lt.a
+    if not is_symmetric(a):
+        raise ValueError("vumps needs a local tensor symmetric under rotations and reflections")
+    A_C = initial_mps(lt, chi, init, rng)
+    C = np.eye(chi) / np.sqrt(chi)
+    A_L, A_R, eps = mixed_gauge(A_C, C)
+    F_L = F_R = None
+    converged, it = False, 0
+    for it in range(1, max_iter + 1):
+        F_L = left_fixed_point(A_L, a, F_L)
+        F_R = right_fixed_point(A_R, a, F_R)
+        _, v = leading_eigenvector(lambda x: apply_h_ac(x.reshape(A_C.shape), F_L, F_R, a).reshape(-1),
+                        A_C.size, A_C.reshape(-1), hermitian=True)
+        A_C = v.reshape(A_C.shape) / np.linalg.norm(v)
+        _, v = leading_eigenvector(lambda x: apply_h_c(x.reshape(C.shape), F_L, F_R).reshape(-1),
+                        C.size, C.reshape(-1), hermitian=True)
+        C = v.reshape(C.shape) / np.linalg.norm(v)
+        A_L, A_R, eps = mixed_gauge(A_C, C)
+        if eps < tol:
+            converged = True
+            break
+    env = to_environment(A_C, C)
+    return VUMPSResult(A_L=A_L, A_R=A_R, A_C=A_C, C=C, env=env,
+                       observables=observables(env, lt, xi=xi),
+                       iterations=it, converged=converged, eps=eps)
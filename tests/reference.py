@@ -0,0 +1,61 @@
+"""
+Exact reference values the engines are checked against: Onsager's solution of
+the square-lattice Ising model and brute-force enumeration of small lattices.
+"""
+
+import itertools
+
+import numpy as np
+from scipy.integrate import quad
+
+BETA_C = 0.5 * np.log(1.0 + np.sqrt(2.0))
+
+
+def onsager_f(beta, J=1.0):
+    """Free energy per site of the infinite square-lattice Ising model at h = 0."""
+    K = beta * abs(J)
+    k = 1.0 / np.sinh(2 * K) ** 2
+
+    def integrand(theta):
+        return np.log(np.cosh(2 * K) ** 2 + np.sqrt(1 + k ** 2 - 2 * k * np.cos(2 * theta)) / k)
+
+    return -(0.5 * np.log(2.0) + quad(integrand, 0.0, np.pi)[0] / (2 * np.pi)) / beta
+
+
+def onsager_m(beta, J=1.0):
+    """Spontaneous magnetization of the square-lattice Ising ferromagnet."""
+    if beta <= BETA_C:
+        return 0.0
+    return (1.0 - np.sinh(2 * beta * J) ** -4) ** 0.125
+
+
+def lattice_bonds(Lx, Ly, periodic=False):
+    """Nearest-neighbour pairs (i, j) of sites numbered x + Lx * y."""
+    bonds = []
+    for y in range(Ly):
+        for x in range(Lx):
+            i = x + Lx * y
+            if x + 1 < Lx or periodic:
+                bonds.append((i, (x + 1) % Lx + Lx * y))
+            if y + 1 < Ly or periodic:
+                bonds.append((i, x + Lx * ((y + 1) % Ly)))
+    return bonds
+
+
+def enumerate_lattice(model, beta, Lx, Ly, periodic=False, site=None):
+    """
+        enumerate_lattice(model, beta, Lx, Ly, periodic=False, site=None) -> (f, m)
+
+    Free energy per site of the Lx x Ly lattice and the mean order parameter of
+    `site` (of all sites if None), summing over all q^(Lx Ly) configurations.
+    """
+    e_bond, e_site, order = model.bond_energy(), model.site_energy(), model.order_parameter()
+    n = Lx * Ly
+    i, j = np.array(lattice_bonds(Lx, Ly, periodic)).T
+    s = np.array(list(itertools.product(range(model.q), repeat=n)))
+    energy = e_bond[s[:, i], s[:, j]].sum(axis=1) + e_site[s].sum(axis=1)
+    weights = np.exp(-beta * (energy - energy.min()))
+    z = weights.sum()
+    local = order[s].mean(axis=1) if site is None else order[s[:, site]]
+    f = -(np.log(z) - beta * energy.min()) / (beta * n)
+    return f, np.dot(weights, local) / z
@@ -0,0 +1,20 @@
+import pytest
+
+from reference import enumerate_lattice, onsager_f, onsager_m
+from src_codes import finite_boundary, ising, local_tensors
+from src_codes.boundary_mps import boundary_mps
+
+
+def test_boundary_mps_matches_onsager():
+    res = boundary_mps(local_tensors(ising(), 0.5), 16)
+    assert res.converged
+    assert res.observables.f == pytest.approx(onsager_f(0.5), abs=1e-10)
+    assert abs(res.observables.m) == pytest.approx(onsager_m(0.5), abs=1e-8)
+
+
+def test_finite_boundary_matches_enumeration():
+    model = ising(h=0.1)
+    res = finite_boundary(local_tensors(model, 0.4), 16, 3, 4)
+    f, m = enumerate_lattice(model, 0.4, 3, 4, site=1 + 3 * 2)
+    assert res.f == pytest.approx(f, abs=1e-12)
+    assert res.m == pytest.approx(m, abs=1e-12)
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from src_codes import EnvironmentCache, ctmrg, ising, local_tensors
+
+
+@pytest.fixture(scope="module")
+def env():
+    return ctmrg(local_tensors(ising(), 0.5), 8).env
+
+
+def test_put_replacing_a_spilled_entry_drops_it_from_the_index(tmp_path, env):
+    cache = EnvironmentCache(tmp_path, max_bytes=0)
+    cache.put(ising(), 0.5, 8, env, m=0.9)
+    assert len(json.loads((tmp_path / "index.json").read_text())) == 1
+    cache.max_bytes = 2 ** 30
+    cache.put(ising(), 0.5, 8, env, m=0.8)
+    assert json.loads((tmp_path / "index.json").read_text()) == []
+    assert list(tmp_path.glob("*.npz")) == []
+    cache.flush()
+    assert EnvironmentCache(tmp_path).m == cache.m
+
+
+def test_run_warm_starts_from_a_nearby_point(tmp_path):
+    cache = EnvironmentCache(tmp_path)
+    cold = cache.run(ising(), 0.5, 8)
+    warm = cache.run(ising(), 0.51, 8)
+    assert cache.near == 1
+    assert warm.iterations < cold.iterations
+    assert warm.observables.f == pytest.approx(ctmrg(local_tensors(ising(), 0.51), 8).observables.f,
+                                               abs=1e-9)
@@ -0,0 +1,26 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from reference import lattice_bonds
+from src_codes import ctmrg, dimers, finite_boundary, hard_squares
+
+CATALAN = 0.915965594177219
+
+
+def test_dimer_entropy_matches_kasteleyn():
+    res = ctmrg(dimers(), 8)
+    assert -res.observables.f == pytest.approx(CATALAN / np.pi, abs=1e-4)
+
+
+def test_hard_squares_match_enumeration():
+    # independent sets S of the 3 x 3 grid with weight z^|S|
+    z = 2.0
+    bonds = lattice_bonds(3, 3)
+    sets = [s for s in itertools.product([0, 1], repeat=9) if not any(s[i] and s[j] for i, j in bonds)]
+    weights = np.array([z ** sum(s) for s in sets])
+    occupied = np.array([s[1 + 3 * 1] for s in sets])
+    res = finite_boundary(hard_squares(z), 16, 3, 3)
+    assert res.f == pytest.approx(-np.log(weights.sum()) / 9, abs=1e-12)
+    assert res.m == pytest.approx(weights @ occupied / weights.sum(), abs=1e-12)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from reference import enumerate_lattice, onsager_f, onsager_m
+from src_codes import ctmrg, finite_ctm, ising, local_tensors, ncon, potts
+
+
+def test_ctmrg_matches_onsager():
+    res = ctmrg(local_tensors(ising(), 0.5), 16)
+    assert res.converged
+    assert res.observables.f == pytest.approx(onsager_f(0.5), abs=1e-10)
+    assert abs(res.observables.m) == pytest.approx(onsager_m(0.5), abs=1e-8)
+
+
+def test_ctmrg_eigh_backend_converges():
+    # eigh used to invert singular values below its noise floor
+    res = ctmrg(local_tensors(ising(), 0.5), 24, backend="eigh")
+    assert res.converged
+    assert res.observables.f == pytest.approx(onsager_f(0.5), abs=1e-7)
+
+
+def test_ctmrg_antiferromagnet_starts_open():
+    # a "fixed" start pins the antiferromagnet in the ferromagnetic sector
+    res = ctmrg(local_tensors(ising(J=-1.0), 0.5), 16)
+    assert res.observables.f == pytest.approx(onsager_f(0.5), abs=1e-9)
+
+
+def test_finite_ctm_matches_enumeration():
+    model = ising(h=0.1)
+    res = finite_ctm(local_tensors(model, 0.4), 4, 1)
+    assert [r.L for r in res] == [2, 4]
+    f2, m2 = enumerate_lattice(model, 0.4, 2, 2)
+    f4, m4 = enumerate_lattice(model, 0.4, 4, 4, site=5)
+    assert res[0].f == pytest.approx(f2, abs=1e-12)
+    assert res[0].m == pytest.approx(m2, abs=1e-12)
+    assert res[1].f == pytest.approx(f4, abs=1e-12)
+    assert res[1].m == pytest.approx(m4, abs=1e-12)
+
+
+def test_finite_ctm_approaches_ctmrg():
+    lt = local_tensors(potts(3), 0.8)
+    res = finite_ctm(lt, 16, 6)
+    f = ctmrg(lt, 16).observables.f
+    errors = [abs(r.f - f) for r in res]
+    assert errors[-1] < 1e-2
+    assert errors == sorted(errors, reverse=True)
+
+
+def test_ncon_matches_einsum():
+    rng = np.random.default_rng(0)
+    A, B, C = rng.standard_normal((3, 4, 5)), rng.standard_normal((5, 6)), rng.standard_normal((6, 4))
+    x = ncon([A, B, C], [[-1, 1, 2], [2, 3], [3, 1]])
+    assert np.allclose(x, np.einsum('abc,cd,db->a', A, B, C))
@@ -0,0 +1,24 @@
+import pytest
+
+from src_codes import Patch, ctmrg, ising, local_tensors
+from src_codes.core import correlator
+
+
+@pytest.fixture(scope="module")
+def converged():
+    lt = local_tensors(ising(), 0.5)
+    return lt, ctmrg(lt, 16, tol=1e-12).env
+
+
+def test_patch_single_site_is_bulk_magnetization(converged):
+    lt, env = converged
+    m = ctmrg(lt, 16, tol=1e-12).observables.m
+    assert Patch(env, lt, 2).expectation({(0, 0): "m"}) == pytest.approx(m, abs=1e-10)
+
+
+def test_patch_row_correlator_matches_column_transfer(converged):
+    lt, env = converged
+    patch = Patch(env, lt, 3, 4)
+    for r in (1, 2, 3):
+        assert patch.expectation({(1, 0): "m", (1, r): "m"}) == pytest.approx(
+            correlator(env, lt, r), abs=1e-10)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from src_codes import hardcore_bosons
+from src_codes.ipeps import double_layer, ipeps
+
+
+def test_double_layer_contracts_the_physical_leg():
+    rng = np.random.default_rng(0)
+    A, O = rng.standard_normal((2, 3, 3, 3, 3)), rng.standard_normal((2, 2))
+    x = double_layer(A, O).reshape((3,) * 8)
+    assert np.allclose(x, np.einsum('prdlu,pq,qRDLU->rRdDlLuU', A, O.T, A))
+    assert np.allclose(double_layer(A), double_layer(A, np.eye(2)))
+
+
+def test_heisenberg_energy_is_variational():
+    # t = 1/2, Delta = 1 is the Heisenberg antiferromagnet, E / N = -0.6694 from QMC
+    h, ops = hardcore_bosons()
+    res = ipeps(h, 2, 6, ops=ops, taus=(0.1, 0.01), rng=np.random.default_rng(0))
+    assert res.converged
+    assert -0.6694 < res.energy < -0.65
+    # half filling at mu = 0, with Neel order between the sublattices
+    assert res.local["n"].sum() == pytest.approx(1.0, abs=1e-4)
+    assert abs(res.local["n"][0] - res.local["n"][1]) > 0.1
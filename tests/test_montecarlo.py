@@ -0,0 +1,20 @@
+import numpy as np
+
+from src_codes import ctmrg, ising, local_tensors, monte_carlo
+from src_codes.montecarlo import binned_error
+
+
+def test_monte_carlo_energy_matches_ctmrg():
+    # beta = 0.3 is far enough from beta_c for the 16 x 16 torus to be bulk-like
+    res = monte_carlo(ising(), 0.3, 16, sweeps=400, thermalize=100, chains=8,
+                      rng=np.random.default_rng(1))
+    E = ctmrg(local_tensors(ising(), 0.3), 16).observables.E
+    assert abs(res.E - E) < 5 * res.E_err + 1e-3
+
+
+def test_binned_error_of_independent_samples():
+    x = np.random.default_rng(2).standard_normal(4096)
+    mean, err, tau = binned_error(x)
+    assert mean == x.mean()
+    assert 0.5 / 64 < err < 2.0 / 64
+    assert tau < 2.0
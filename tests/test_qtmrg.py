@@ -0,0 +1,19 @@
+import pytest
+
+from src_codes import chain_hamiltonian, exact_chain, transfer_free_energy
+from src_codes.qtmrg import qtmrg
+
+
+def test_qtmrg_matches_quantum_transfer_matrix():
+    # same Trotter network, contracted along time instead of space
+    h, ops = chain_hamiltonian()
+    res = qtmrg(h, ops, 0.8, eps=0.1, chi=32)
+    assert res.beta[-1] == pytest.approx(0.8)
+    assert res.f[-1] == pytest.approx(transfer_free_energy(h, 0.8, 8), abs=1e-8)
+
+
+def test_transfer_free_energy_matches_exact_chain():
+    # only the O(eps^2) Trotter error and the finite-ring correction remain
+    h, ops = chain_hamiltonian()
+    f_ring = exact_chain(h, ops, 10, [0.8]).f[0]
+    assert transfer_free_energy(h, 0.8, 8) == pytest.approx(f_ring, abs=1e-4)
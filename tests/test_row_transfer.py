@@ -0,0 +1,23 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src_codes import strip_spectrum
+
+
+def dense_transfer(L, beta, J, h, Jy, periodic):
+    # row transfer matrix with the energy of each row split between its two neighbours
+    s = np.array(list(itertools.product([1.0, -1.0], repeat=L)))
+    right = np.roll(s, -1, axis=1) if periodic else np.pad(s[:, 1:], ((0, 0), (0, 1)))
+    row = J * (s * right).sum(axis=1) + h * s.sum(axis=1)
+    return np.exp(beta * (Jy * s @ s.T + 0.5 * row[:, None] + 0.5 * row[None, :]))
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+def test_strip_spectrum_matches_dense_transfer_matrix(periodic):
+    L, beta, J, h, Jy = 5, 0.4, 1.0, 0.1, 0.7
+    lam = np.sort(np.abs(np.linalg.eigvalsh(dense_transfer(L, beta, J, h, Jy, periodic))))[::-1]
+    res = strip_spectrum(L, beta, J=J, h=h, Jy=Jy, periodic=periodic)
+    assert res.free_energy == pytest.approx(-np.log(lam[0]) / (beta * L), abs=1e-12)
+    assert res.xi == pytest.approx(1.0 / np.log(lam[0] / lam[1]), rel=1e-8)
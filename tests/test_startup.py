@@ -0,0 +1,26 @@
+from src_codes import core, ctmrg, ising, startup
+
+
+def test_plans_and_tensors_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup, "_TENSORS", {})
+    monkeypatch.setattr(core, "NCON_PLANS", {})
+    lt = startup.local_tensors(ising(), 0.44)
+    ctmrg(lt, 8, max_iter=5)
+    plans = dict(core.NCON_PLANS)
+    startup.save(tmp_path)
+    core.NCON_PLANS.clear()
+    startup._TENSORS.clear()
+    assert startup.load(tmp_path) == (len(plans), 1)
+    assert core.NCON_PLANS == plans
+    assert (startup.local_tensors(ising(), 0.44).a == lt.a).all()
+
+
+def test_load_skips_a_truncated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(startup, "_TENSORS", {})
+    startup.local_tensors(ising(), 0.44)
+    startup.save(tmp_path)
+    data = (tmp_path / "tensors.npz").read_bytes()
+    (tmp_path / "tensors.npz").write_bytes(data[:len(data) // 2])
+    (tmp_path / "plans.json").write_text("[")
+    startup._TENSORS.clear()
+    assert startup.load(tmp_path) == (0, 0)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src_codes import ResultStore, ising
+
+
+def test_strip_records_differ_by_coupling_and_boundary(tmp_path):
+    store = ResultStore(tmp_path)
+    periodic = store.strip(4, 0.4)
+    anisotropic = store.strip(4, 0.4, Jy=0.5)
+    open_strip = store.strip(4, 0.4, periodic=False)
+    assert len(store) == 3
+    assert len({periodic["f"], anisotropic["f"], open_strip["f"]}) == 3
+    assert store.strip(4, 0.4, Jy=0.5) == anisotropic
+    assert len(store) == 3
+
+
+def test_strip_rejects_arguments_outside_the_record(tmp_path):
+    with pytest.raises(ValueError):
+        ResultStore(tmp_path).strip(4, 0.4, which="SA")
+
+
+def test_run_reruns_unconverged_points(tmp_path):
+    store = ResultStore(tmp_path)
+    first = store.run(ising(), 0.5, 8, max_iter=2)
+    assert not first["converged"]
+    second = store.run(ising(), 0.5, 8)
+    assert second["converged"]
+    assert store.run(ising(), 0.5, 8, max_iter=2) == second
+    assert store.run(ising(), 0.5, 8, tol=1e-6)["tol"] == 1e-6
+    assert len(store) == 3
+
+
+def test_rows_survive_flush_and_reopen(tmp_path):
+    store = ResultStore(tmp_path, chunk_rows=2)
+    for beta in (0.3, 0.4, 0.5):
+        store.strip(3, beta)
+    store.flush()
+    assert len(list(tmp_path.glob("chunk-*.npz"))) == 2
+    reopened = ResultStore(tmp_path)
+    assert len(reopened) == 3
+    assert np.allclose(np.sort(reopened.select(method="strip")["beta"]), [0.3, 0.4, 0.5])
+    assert reopened.strip(3, 0.4)["f"] == store.strip(3, 0.4)["f"]
@@ -0,0 +1,47 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src_codes import stream_chain
+from src_codes.tmrg import ising_transfer, tmrg
+
+
+def enumerate_chain(beta, J, h):
+    # ln Z, <s_j> and <s_j s_j+1> of the periodic Ising chain with couplings J_i, fields h_i
+    s = np.array(list(itertools.product([1.0, -1.0], repeat=len(J))))
+    energy = -(J * s * np.roll(s, -1, axis=1)).sum(axis=1) - (h * s).sum(axis=1)
+    w = np.exp(-beta * energy)
+    z = w.sum()
+    return np.log(z), w @ s / z, w @ (s * np.roll(s, -1, axis=1)) / z
+
+
+@pytest.fixture
+def chain():
+    rng = np.random.default_rng(3)
+    return 0.7, rng.uniform(0.5, 1.5, 10), rng.uniform(-0.3, 0.3, 10)
+
+
+def test_tmrg_matches_enumeration(chain):
+    beta, J, h = chain
+    log_z, m, _ = enumerate_chain(beta, J, h)
+    res = tmrg(ising_transfer(beta, J, h), 2, beta=beta)
+    assert res.log_z == pytest.approx(log_z, abs=1e-12)
+    assert res.free_energy == pytest.approx(-log_z / (beta * len(J)), abs=1e-12)
+    assert res.magnetization == pytest.approx(m[len(J) // 2], abs=1e-12)
+
+
+def test_tmrg_batches_samples(chain):
+    beta, J, h = chain
+    stacked = tmrg(ising_transfer(beta, np.stack([J, J[::-1]]), np.stack([h, h[::-1]])), 2, beta=beta)
+    assert stacked.log_z[0] == pytest.approx(enumerate_chain(beta, J, h)[0], abs=1e-12)
+    assert stacked.log_z[1] == pytest.approx(enumerate_chain(beta, J[::-1], h[::-1])[0], abs=1e-12)
+
+
+def test_stream_chain_matches_enumeration(chain):
+    beta, J, h = chain
+    log_z, m, ss = enumerate_chain(beta, J, h)
+    res = stream_chain(np.stack([J, h], axis=1), beta, sites=[3, 9], chunk=4)
+    assert res.log_z == pytest.approx(log_z, abs=1e-12)
+    assert np.allclose(res.magnetization, m[[3, 9]], atol=1e-12)
+    assert np.allclose(res.bond_correlation, ss[[3, 9]], atol=1e-12)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from reference import onsager_f
+from src_codes import ctmrg, ising, local_tensors
+from src_codes.trg import _pair_gram, hotrg, hotrg_isometry, trg
+
+
+def test_trg_matches_onsager():
+    res = trg(local_tensors(ising(), 0.5), 16, steps=30)
+    assert res.observables.f == pytest.approx(onsager_f(0.5), abs=1e-5)
+
+
+def test_hotrg_matches_onsager_and_ctmrg():
+    lt = local_tensors(ising(), 0.5)
+    obs = hotrg(lt, 10, steps=24).observables
+    assert obs.f == pytest.approx(onsager_f(0.5), abs=1e-6)
+    assert obs.E == pytest.approx(ctmrg(lt, 16).observables.E, abs=1e-4)
+
+
+@pytest.mark.parametrize("side", [0, 2])
+def test_pair_gram_is_gram_of_the_unfolding(side):
+    rng = np.random.default_rng(1)
+    top, bottom = rng.standard_normal((2, 3, 4, 5)), rng.standard_normal((6, 7, 8, 3))
+    pair = np.tensordot(top, bottom, axes=([1], [3]))            # [r1, l1, u1, r2, d2, l2]
+    legs = (0, 3) if side == 0 else (1, 5)
+    M = np.moveaxis(pair, legs, (0, 1)).reshape(pair.shape[legs[0]] * pair.shape[legs[1]], -1)
+    assert np.allclose(_pair_gram(top, bottom, side), M @ M.T)
+
+
+def test_hotrg_isometry_is_shaped_by_the_chosen_side():
+    # rank-one r legs: only the right unfolding (5 x 5 legs) truncates exactly
+    rng = np.random.default_rng(2)
+    v = rng.standard_normal(5)
+    top = np.einsum('r,dlu->rdlu', v, rng.standard_normal((3, 2, 4)))
+    bottom = np.einsum('r,dlu->rdlu', v, rng.standard_normal((4, 2, 3)))
+    U, err = hotrg_isometry(top, bottom, 2)
+    assert U.shape == (5, 5, 2)
+    assert err == pytest.approx(0.0, abs=1e-12)
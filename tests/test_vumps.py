@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from reference import onsager_f, onsager_m
+from src_codes import ising, local_tensors
+from src_codes.vumps import leading_eigenvector, vumps
+
+
+def test_vumps_matches_onsager():
+    res = vumps(local_tensors(ising(), 0.5), 16)
+    assert res.converged
+    assert res.observables.f == pytest.approx(onsager_f(0.5), abs=1e-10)
+    assert abs(res.observables.m) == pytest.approx(onsager_m(0.5), abs=1e-8)
+
+
+def test_leading_eigenvector_rejects_nonsymmetric_hermitian():
+    M = np.array([[2.0, 1.0], [0.0, 1.0]])
+    with pytest.raises(ValueError):
+        leading_eigenvector(lambda v: M @ v, 2, hermitian=True)